@@ -0,0 +1,215 @@
+"""
+Shared HTTP client for ClinicalTrials.gov API calls
+Owns the app-wide connection pool that is created in the FastAPI lifespan
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+
+from rate_limiter import rate_limiter, parse_retry_after, backoff_delay, RETRY_MAX_ATTEMPTS
+from circuit_breaker import CLOSED, upstream_breaker
+from hedging import Hedger
+
+logger = logging.getLogger(__name__)
+
+# API endpoint and connection pool settings (overridable through environment)
+CTGOV_API_BASE = os.getenv("CTGOV_API_BASE", "https://clinicaltrials.gov/api/v2").rstrip("/")
+HTTP_TIMEOUT = float(os.getenv("CTGOV_HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("CTGOV_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("CTGOV_HTTP_MAX_CONNECTIONS", "40"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CTGOV_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("CTGOV_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("CTGOV_HTTP_MAX_PER_HOST", "10"))
+HTTP2_ENABLED = os.getenv("CTGOV_HTTP2", "1").lower() not in ("0", "false", "no")
+
+# Upstream statuses worth retrying (throttling and transient gateway errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Transport wrapper that caps concurrent in-flight requests per host
+
+    httpx only supports pool-wide limits, so this keeps one host from
+    taking every connection in the shared pool.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore_for(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_per_host)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # The slot is held until the body has been downloaded (still encoded;
+        # the client decodes it)
+        async with self._semaphore_for(request.url.host):
+            response = await self._transport.handle_async_request(request)
+            try:
+                body = b"".join([chunk async for chunk in response.aiter_raw()])
+            finally:
+                await response.aclose()
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(body),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build the pooled client used for every ClinicalTrials.gov request
+
+    Returns:
+        AsyncClient with keep-alive, optional HTTP/2 and per-host connection caps
+    """
+    http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    if HTTP2_ENABLED and not http2:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=1),
+        max_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+    )
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        headers={"Accept": "application/json"},
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Create the shared client (called from the FastAPI lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+        logger.info(
+            f"Shared HTTP client started: max_connections={HTTP_MAX_CONNECTIONS}, "
+            f"per_host={HTTP_MAX_CONNECTIONS_PER_HOST}, keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS}"
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and release pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared client, creating it lazily outside the app lifespan
+    (scripts and batch jobs that never start FastAPI)
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def get_with_retries(url: str, params: Optional[Dict] = None,
+                           client: Optional[httpx.AsyncClient] = None, hedger: Optional[Hedger] = None,
+                           **kwargs) -> httpx.Response:
+    """
+    GET through the shared rate limiter with capped, jittered retries
+
+    Retries 429 / 5xx responses and transport errors up to RETRY_MAX_ATTEMPTS
+    times, honoring Retry-After when the server sends it. Every attempt goes
+    through the upstream circuit breaker, and while the circuit is open
+    CircuitOpenError is raised without contacting the server. A call whose
+    retries all end in 5xx / transport errors counts as one failure, so a
+    single unlucky request cannot open the circuit for everyone.
+
+    Args:
+        url: Request URL
+        params: Query parameters
+        client: HTTP client to use, defaults to the shared app-wide client
+        hedger: Races a duplicate against attempts slower than its latency
+                percentile (the duplicate takes its own rate limiter token)
+        **kwargs: Passed through to client.get (e.g. timeout)
+
+    Returns:
+        Successful response (raises httpx.HTTPStatusError once retries run out)
+    """
+    client = client or get_http_client()
+    attempt = 0
+    trial = False
+
+    while True:
+        # The half-open trial keeps its slot through its own retries
+        trial = upstream_breaker.before_call(trial=trial)
+        await rate_limiter.acquire()
+
+        try:
+            if hedger is not None:
+                response = await hedger.run(lambda: client.get(url, params=params, **kwargs),
+                                            admit=rate_limiter.acquire)
+            else:
+                response = await client.get(url, params=params, **kwargs)
+        except httpx.TransportError as e:
+            record_upstream_failure(attempt)
+            if attempt >= RETRY_MAX_ATTEMPTS:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Transport error on {url} ({str(e)}), retry {attempt + 1} in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                upstream_breaker.record_success()
+                rate_limiter.on_success()
+                response.raise_for_status()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                rate_limiter.on_throttle(retry_after)
+            else:
+                record_upstream_failure(attempt)
+
+            if attempt >= RETRY_MAX_ATTEMPTS:
+                response.raise_for_status()
+
+            delay = max(retry_after or 0.0, backoff_delay(attempt))
+            logger.warning(f"HTTP {response.status_code} from {url}, retry {attempt + 1} in {delay:.2f}s")
+
+        rate_limiter.retries += 1
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def record_upstream_failure(attempt: int) -> None:
+    """
+    Report a failed attempt to the circuit breaker once it decides the call
+
+    Intermediate retries are not counted: the breaker sees one failure per
+    logical call, when its last attempt fails. A half-open trial attempt is
+    reported right away so a still-broken upstream re-opens the circuit.
+    """
+    if attempt >= RETRY_MAX_ATTEMPTS or upstream_breaker.state != CLOSED:
+        upstream_breaker.record_failure()
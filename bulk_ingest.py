@@ -0,0 +1,197 @@
+"""
+Offline bootstrap of the local trial mirror from the ClinicalTrials.gov
+full-dataset export (ctg-studies.json.zip, or a JSON array download)
+Runs without network access; the API sync can take over afterwards
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from clinicaltrials_api import filter_recruiting_trials, is_recruiting_trial
+from enhanced_data_extraction import extract_basic_trial_data
+from json_stream import StudyStreamParser
+from trial_store import TrialStore, TRIAL_STORE_PATH, get_last_update_date
+from utils import extract_nct_id
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_QUEUE_BATCHES = 4          # parsed batches buffered ahead of the writer
+READ_CHUNK_BYTES = 1024 * 1024
+
+# protocolSection modules the matching, scoring and report code read; everything
+# else (results, derived, references, ...) is dropped from the stored records
+STORED_MODULES = (
+    "identificationModule",
+    "statusModule",
+    "conditionsModule",
+    "descriptionModule",
+    "designModule",
+    "eligibilityModule",
+    "armsInterventionsModule",
+    "contactsLocationsModule",
+)
+
+
+def iter_dump_studies(path: str) -> Iterator[Dict]:
+    """
+    Stream raw studies out of an export file
+
+    Accepts the official zip of per-study JSON files as well as a single
+    JSON document (a top-level array, or an API-style {"studies": [...]} page),
+    which is decoded incrementally so it is never loaded as a whole.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if not name.endswith(".json"):
+                    continue
+                with archive.open(name) as member:
+                    try:
+                        yield json.load(member)
+                    except ValueError as e:
+                        logger.warning(f"Skipping unreadable export member {name}: {str(e)}")
+        return
+
+    parser = StudyStreamParser()
+    with open(path, "rb") as dump:
+        while True:
+            chunk = dump.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def compact_study(study: Dict) -> Dict:
+    """Keep only the protocolSection modules the app reads"""
+    protocol_section = study.get("protocolSection", {})
+    return {"protocolSection": {
+        module: protocol_section[module] for module in STORED_MODULES if module in protocol_section
+    }}
+
+
+def read_batch(studies: Iterator[Dict], batch_size: int, stats: Dict[str, int],
+               collect_removals: bool = True) -> Optional[Tuple[List[Dict], List[str]]]:
+    """
+    Pull the next batch from the export
+
+    Returns (recruiting studies filtered with filter_recruiting_trials and
+    compacted, NCT IDs of the other studies), or None once the export is
+    exhausted. The other IDs are only collected when collect_removals is
+    set: the writer deletes the ones the mirror still holds (they stopped
+    recruiting), as the API sync does.
+    """
+    raw = []
+    for study in studies:
+        raw.append(study)
+        if len(raw) >= batch_size:
+            break
+    if not raw:
+        return None
+
+    stats["read"] += len(raw)
+    stats["newest"] = max([stats["newest"]] + [get_last_update_date(study) for study in raw])
+
+    batch = []
+    recruiting = filter_recruiting_trials(raw)
+    for study in recruiting:
+        compact = compact_study(study)
+        # Records the detail extraction cannot identify cannot be stored or matched
+        if not extract_basic_trial_data(compact).get("nct_id"):
+            stats["invalid"] += 1
+            continue
+        batch.append(compact)
+
+    removals = []
+    if collect_removals:
+        removals = [extract_nct_id(study) for study in raw if not is_recruiting_trial(study)]
+        removals = [nct_id for nct_id in removals if nct_id]
+
+    return batch, removals
+
+
+async def ingest_dump(path: str, store: Optional[TrialStore] = None,
+                      batch_size: int = INGEST_BATCH_SIZE) -> Dict:
+    """
+    Load an export file into the mirror
+
+    Reading/decompressing and SQLite writes run in separate worker threads
+    connected by a small queue, so parsing the next batch overlaps with
+    committing the previous one. The sync marker is set to the newest
+    lastUpdatePostDate in the export, so sync_trial_store() continues
+    incrementally from the snapshot.
+
+    Args:
+        path: ctg-studies.json.zip or a JSON export
+        store: Target store, defaults to one at TRIAL_STORE_PATH
+        batch_size: Studies read per batch
+
+    Returns:
+        Ingest statistics
+    """
+    store = store or TrialStore(TRIAL_STORE_PATH)
+    stats = {"read": 0, "invalid": 0, "stored": 0, "removed": 0, "batches": 0, "newest": ""}
+    studies = iter_dump_studies(path)
+    # Bootstrapping an empty mirror has nothing to delete
+    collect_removals = store.count() > 0
+    queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_BATCHES)
+
+    async def produce():
+        try:
+            while True:
+                batch = await asyncio.to_thread(read_batch, studies, batch_size, stats, collect_removals)
+                if batch is None:
+                    break
+                await queue.put(batch)
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            await queue.put(None)  # let the writer stop; the error is re-raised to ingest_dump
+            raise
+        await queue.put(None)
+
+    async def consume():
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            recruiting, removals = batch
+            if recruiting:
+                result = await asyncio.to_thread(store.upsert_studies, recruiting)
+                stats["stored"] += result["stored"]
+            if removals:
+                stats["removed"] += await asyncio.to_thread(store.remove_studies, removals)
+            stats["batches"] += 1
+            if stats["batches"] % 20 == 0:
+                logger.info(f"Ingest progress: {stats['read']} read, {stats['stored']} stored")
+
+    logger.info(f"Ingesting export {path} into {store.path}")
+    producer = asyncio.ensure_future(produce())
+    try:
+        await consume()
+        await producer  # surfaces read errors
+    finally:
+        producer.cancel()
+
+    if stats["newest"]:
+        store.set_sync_marker(stats["newest"])
+
+    logger.info(f"Ingest complete: {stats}, mirror now holds {store.count()} studies")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap the local mirror from a ClinicalTrials.gov export")
+    parser.add_argument("path", help="ctg-studies.json.zip or a JSON export file")
+    parser.add_argument("--db", default=TRIAL_STORE_PATH, help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="studies per write batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(ingest_dump(args.path, TrialStore(args.db), batch_size=args.batch_size)))
@@ -0,0 +1,126 @@
+"""
+Circuit breaker for ClinicalTrials.gov
+After repeated upstream failures every call fails fast for a cool-down
+period instead of queueing behind slow, failing requests
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CTGOV_CIRCUIT_FAILURE_THRESHOLD", "5"))    # consecutive failures
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CTGOV_CIRCUIT_RECOVERY_TIMEOUT", "30"))  # seconds open
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    - closed: calls go through; failure_threshold failures in a row open it
+    - open: calls are rejected until recovery_timeout has passed
+    - half_open: a single trial call is let through; success closes the
+      circuit, failure opens it again
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT, name: str = "circuit"):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.name = name
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = None
+
+        self.opened_count = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected (open and still cooling down)"""
+        return self.state == OPEN and self.retry_in() > 0
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit lets a trial call through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+    def before_call(self, trial: bool = False) -> bool:
+        """
+        Admit a call or raise CircuitOpenError
+
+        Returns True when the call was admitted as the half-open trial. Its
+        retries (e.g. after a 429) pass trial=True and are admitted again
+        while the circuit stays half-open, instead of being rejected as a
+        second trial.
+        """
+        now = time.monotonic()
+        if self.state == OPEN and self.retry_in() <= 0:
+            self.state = HALF_OPEN
+            self._trial_started = None
+            logger.info(f"{self.name}: circuit half-open, letting a trial request through")
+
+        if self.state == HALF_OPEN:
+            # A trial that never reported back (e.g. its caller was cancelled) is given up on
+            trial_pending = self._trial_started is not None and now - self._trial_started < self.recovery_timeout
+            if trial or not trial_pending:
+                self._trial_started = now
+                return True
+
+        if self.state != CLOSED:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_in())
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"{self.name}: upstream recovered, circuit closed")
+        self.state = CLOSED
+        self._failures = 0
+        self._trial_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == OPEN:
+            return  # a straggler from before the circuit opened; keep the original cool-down
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        if self.state != OPEN:
+            self.opened_count += 1
+            logger.warning(f"{self.name}: circuit opened after {self._failures} consecutive failures, "
+                           f"failing fast for {self.recovery_timeout:.0f}s")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_in_seconds": round(self.retry_in(), 2),
+            "opened_count": self.opened_count,
+            "rejected": self.rejected,
+        }
+
+
+# Shared by every outbound ClinicalTrials.gov request in the process
+upstream_breaker = CircuitBreaker(name="ctgov")
@@ -1,115 +1,303 @@
 import httpx
 import asyncio
-from typing import List, Dict, Optional
+from contextlib import aclosing
+from typing import List, Dict, Optional, Sequence, Tuple
 import logging
 
+from api_client import CTGOV_API_BASE, get_http_client, get_with_retries
+from json_stream import StudyStreamParser
+from paginator import (
+    PagePrefetcher, iter_body_studies, partition_count,
+    start_date_partitions, partition_params, SEARCH_PARTITIONS
+)
+from utils import extract_nct_id
+from query_cache import search_cache, make_cache_key
+from singleflight import search_flight, study_flight
+from circuit_breaker import CircuitOpenError, upstream_breaker
+from hedging import study_hedger
+from request_context import note_stale_query
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
 RELEVANT_STATUSES = {"RECRUITING", "NOT_YET_RECRUITING"}
 
-
-async def search_trials_basic(condition: str, max_results: Optional[int] = None) -> List[Dict]:
+# Errors meaning upstream could not answer (stale cache results are served instead)
+UPSTREAM_ERRORS = (httpx.HTTPError, CircuitOpenError)
+
+# Cache keys with a background revalidation pending, and the tasks doing it
+_revalidating = set()
+_background_tasks = set()
+
+# Fields read by the hard eligibility gates and score_trial (API `fields` parameter)
+SEARCH_FIELDS = (
+    "protocolSection.identificationModule.nctId",
+    "protocolSection.identificationModule.officialTitle",
+    "protocolSection.statusModule.overallStatus",
+    "protocolSection.statusModule.lastUpdatePostDateStruct",
+    "protocolSection.eligibilityModule",
+    "protocolSection.designModule.studyType",
+    "protocolSection.designModule.phases",
+    "protocolSection.armsInterventionsModule.interventions",
+)
+
+# Fields read by extract_basic_trial_data for the detail enrichment step
+DETAIL_FIELDS = (
+    "protocolSection.identificationModule.nctId",
+    "protocolSection.identificationModule.officialTitle",
+    "protocolSection.identificationModule.briefTitle",
+    "protocolSection.statusModule.overallStatus",
+    "protocolSection.descriptionModule.briefSummary",
+    "protocolSection.designModule.studyType",
+    "protocolSection.designModule.phases",
+    "protocolSection.eligibilityModule",
+    "protocolSection.contactsLocationsModule",
+)
+
+# IDs per bulk /studies?filter.ids= request (keeps the URL well under server limits)
+BULK_FETCH_CHUNK_SIZE = 100
+
+
+def format_fields(fields: Optional[Sequence[str]]) -> Optional[str]:
+    """Join a field set for the API `fields` parameter (None requests the full record)"""
+    return ",".join(fields) if fields else None
+
+
+async def search_trials_basic(condition: str, max_results: Optional[int] = None,
+                              filters: Optional[Dict[str, str]] = None,
+                              client: Optional[httpx.AsyncClient] = None,
+                              fields: Optional[Sequence[str]] = SEARCH_FIELDS) -> List[Dict]:
     """
     Basic clinical trial search with unlimited results support
 
     Args:
         condition: Search condition (disease name, gene mutation, etc.)
         max_results: Maximum results to return, None for unlimited
+        filters: Extra server-side filter parameters (filter.overallStatus, filter.advanced, ...)
+        client: HTTP client to use, defaults to the shared app-wide client
+        fields: Field projection, defaults to what gating and scoring read; None for full records
 
     Returns:
-        List of recruiting clinical trials
+        List of recruiting clinical trials. If upstream fails (or its circuit is
+        open) and an expired cached result exists, that result is returned,
+        noted as stale on the current request, and refreshed in the background.
+    """
+
+    fields_param = format_fields(fields)
+    cache_key = make_cache_key("search", condition, max_results, filters, fields_param)
+    cached_trials = await search_cache.lookup(cache_key)
+    if cached_trials is not None:
+        logger.info(f"Cache hit: {condition} -> {len(cached_trials)} recruiting trials")
+        return list(cached_trials)
+
+    def fetch():
+        return _fetch_search_results(condition, max_results, filters, fields_param, client, cache_key)
+
+    # Concurrent identical searches share one paginated fetch
+    try:
+        trials = await search_flight.do(cache_key, fetch)
+    except UPSTREAM_ERRORS:
+        stale_trials = await search_cache.lookup(cache_key, allow_stale=True)
+        if stale_trials is None:
+            raise
+
+        logger.warning(f"Upstream unavailable, serving stale results: {condition} -> {len(stale_trials)} trials")
+        note_stale_query(condition)
+        _schedule_revalidation(cache_key, fetch)
+        return list(stale_trials)
+
+    return list(trials)
+
+
+def _schedule_revalidation(cache_key: str, fetch) -> None:
+    """Refresh a stale search in the background once the circuit lets requests through again"""
+    if cache_key in _revalidating:
+        return
+    _revalidating.add(cache_key)
+
+    async def revalidate():
+        try:
+            await asyncio.sleep(upstream_breaker.retry_in())
+            await search_flight.do(cache_key, fetch)  # caches the fresh result on success
+        except Exception as e:
+            logger.info(f"Background revalidation failed, keeping stale results: {str(e)}")
+        finally:
+            _revalidating.discard(cache_key)
+
+    task = asyncio.ensure_future(revalidate())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _fetch_search_results(condition: str, max_results: Optional[int], filters: Optional[Dict[str, str]],
+                                fields_param: Optional[str], client: Optional[httpx.AsyncClient],
+                                cache_key: str) -> List[Dict]:
     """
+    Paginate through the live API for one search condition and cache the result
 
+    Broad queries (per countTotal) are split into disjoint start-date slices
+    that are paged concurrently and merged in slice order.
+    """
     logger.info(f"Searching clinical trials: {condition}, max results: {max_results or 'unlimited'}")
 
-    all_trials = []
     page_size = 1000  # Maximum per page
-    page_token = None
-    total_fetched = 0
-
-    async with httpx.AsyncClient(timeout=30) as client:
-        while True:
-            try:
-                # Build request parameters
-                params = {
-                    "query.term": condition,
-                    "pageSize": page_size,
-                    "format": "json"
-                }
-
-                # Add pagination token if available
-                if page_token:
-                    params["pageToken"] = page_token
-
-                # Make API request
-                response = await client.get(
-                    "https://clinicaltrials.gov/api/v2/studies",
-                    params=params
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                # Extract studies
-                studies = data.get("studies", [])
-                if not studies:
-                    logger.info(f"No more trial data found, stopping pagination")
-                    break
-
-                # Filter for recruiting trials
-                recruiting_trials = filter_recruiting_trials(studies)
-                all_trials.extend(recruiting_trials)
-                total_fetched += len(recruiting_trials)
-
-                logger.info(f"Fetched {len(recruiting_trials)} recruiting trials this page, total: {total_fetched}")
-
-                # Check if we've reached the maximum results limit
-                if max_results and total_fetched >= max_results:
-                    all_trials = all_trials[:max_results]
-                    logger.info(f"Reached maximum results limit {max_results}, stopping search")
-                    break
-
-                # Check if there's a next page
-                next_page_token = data.get("nextPageToken")
-                if not next_page_token:
-                    logger.info("No more pages available, search complete")
-                    break
-
-                page_token = next_page_token
-
-                # Add small delay to avoid rate limiting
-                await asyncio.sleep(0.1)
-
-            except httpx.HTTPStatusError as e:
-                logger.error(f"HTTP error {e.response.status_code}: {e.response.text}")
-                if e.response.status_code == 429:  # Rate limited
-                    logger.info("Rate limited, waiting 3 seconds before retry...")
-                    await asyncio.sleep(3)
+    url = f"{CTGOV_API_BASE}/studies"
+    client = client or get_http_client()
+
+    # Build request parameters
+    params = {
+        "query.term": condition,
+        "pageSize": page_size,
+        "format": "json"
+    }
+    if filters:
+        params.update(filters)
+    if fields_param:
+        params["fields"] = fields_param
+
+    # Pages are fetched by a prefetcher (rate limited, retries 429/5xx with backoff)
+    # that requests the next page as soon as its token is known.
+    may_partition = not max_results and SEARCH_PARTITIONS > 1
+    pages = PagePrefetcher(url, params, client=client, count_total=may_partition)
+    partitions = []
+
+    if may_partition:
+        # The first page carries countTotal; it is reused unless the search is broad enough to slice
+        try:
+            total = await pages.first_page()
+        except BaseException:
+            await pages.aclose()
+            raise
+
+        partitions = start_date_partitions(partition_count(total, page_size))
+        if partitions:
+            await pages.aclose()
+            logger.info(f"Broad search '{condition}' ({total} studies): paging {len(partitions)} start-date slices")
+
+    if partitions:
+        slice_pages = [PagePrefetcher(url, partition_params(params, partition), client=client)
+                       for partition in partitions]
+        slice_tasks = [asyncio.ensure_future(_collect_pages(slice_pager, condition, None))
+                       for slice_pager in slice_pages]
+        try:
+            slice_results = await asyncio.gather(*slice_tasks)
+        finally:
+            for task in slice_tasks:
+                task.cancel()
+            await asyncio.gather(*slice_tasks, return_exceptions=True)
+
+        # Slices are disjoint; dedupe anyway in case a study moved between slices mid-scan
+        all_trials = []
+        seen_nct_ids = set()
+        for trials, _ in slice_results:
+            for trial in trials:
+                nct_id = extract_nct_id(trial)
+                if nct_id and nct_id in seen_nct_ids:
                     continue
-                else:
-                    raise
-            except Exception as e:
-                logger.error(f"Error searching for '{condition}': {str(e)}")
-                break
+                if nct_id:
+                    seen_nct_ids.add(nct_id)
+                all_trials.append(trial)
+
+        complete = all(slice_complete for _, slice_complete in slice_results)
+        pages_fetched = sum(slice_pager.pages_fetched for slice_pager in slice_pages)
+    else:
+        all_trials, complete = await _collect_pages(pages, condition, max_results)
+        pages_fetched = pages.pages_fetched
+
+    # Only cache full result sets, never ones cut short by an error
+    if complete:
+        await search_cache.store(cache_key, all_trials)
 
-    logger.info(f"Search complete: {condition} -> {len(all_trials)} recruiting trials")
+    logger.info(f"Search complete: {condition} -> {len(all_trials)} recruiting trials "
+                f"({pages_fetched} pages fetched)")
     return all_trials
 
 
-def filter_recruiting_trials(studies: List[Dict]) -> List[Dict]:
-    """Filter studies to only include those that are recruiting"""
-    recruiting_trials = []
+async def _collect_pages(pages: PagePrefetcher, condition: str,
+                         max_results: Optional[int]) -> Tuple[List[Dict], bool]:
+    """
+    Consume one paginated search, returning (recruiting trials, whether the scan completed)
 
-    for trial in studies:
-        try:
-            status = trial.get("protocolSection", {}).get("statusModule", {}).get("overallStatus", "")
-            if status in RELEVANT_STATUSES:
-                recruiting_trials.append(trial)
-        except Exception as e:
-            logger.warning(f"Error parsing trial status: {str(e)}")
-            continue
+    Each page is parsed incrementally: studies are filtered and deduplicated
+    as they are decoded, and rejected ones are dropped immediately.
+    """
+    all_trials = []
+    seen_nct_ids = set()
+    complete = False
 
-    return recruiting_trials
+    try:
+        async for body in pages:
+            parser = StudyStreamParser()
+            page_studies = 0
+            page_kept = 0
+            reached_limit = False
+
+            async with aclosing(iter_body_studies(body, parser)) as studies:
+                async for study in studies:
+                    page_studies += 1
+                    if not is_recruiting_trial(study):
+                        continue
+
+                    nct_id = extract_nct_id(study)
+                    if nct_id in seen_nct_ids:
+                        continue
+                    if nct_id:
+                        seen_nct_ids.add(nct_id)
+
+                    all_trials.append(study)
+                    page_kept += 1
+
+                    if max_results and len(all_trials) >= max_results:
+                        reached_limit = True
+                        break
+
+            if page_studies == 0:
+                logger.info(f"No more trial data found, stopping pagination")
+                complete = True
+                break
+
+            logger.info(f"Fetched {page_kept} recruiting trials this page, total: {len(all_trials)}")
+
+            # Check if we've reached the maximum results limit
+            if reached_limit:
+                logger.info(f"Reached maximum results limit {max_results}, stopping search")
+                complete = True
+                break
+
+            # Check if there's a next page
+            if not parser.fields.get("nextPageToken"):
+                logger.info("No more pages available, search complete")
+                complete = True
+                break
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error {e.response.status_code}: {e.response.text}")
+        raise
+    except UPSTREAM_ERRORS as e:
+        # Surface outages instead of returning a silently truncated result
+        logger.error(f"Upstream error searching for '{condition}': {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Error searching for '{condition}': {str(e)}")
+    finally:
+        await pages.aclose()
+
+    return all_trials, complete
+
+
+def is_recruiting_trial(trial: Dict) -> bool:
+    """Check whether a single study is recruiting or not yet recruiting"""
+    try:
+        status = trial.get("protocolSection", {}).get("statusModule", {}).get("overallStatus", "")
+        return status in RELEVANT_STATUSES
+    except Exception as e:
+        logger.warning(f"Error parsing trial status: {str(e)}")
+        return False
+
+
+def filter_recruiting_trials(studies: List[Dict]) -> List[Dict]:
+    """Filter studies to only include those that are recruiting"""
+    return [trial for trial in studies if is_recruiting_trial(trial)]
 
 
 async def search_trials_batch(search_queries: List[str], max_results_per_query: Optional[int] = None) -> Dict[
@@ -152,33 +340,133 @@ async def search_trials_batch(search_queries: List[str], max_results_per_query:
     return results
 
 
-async def get_trial_details(nct_id: str) -> Optional[Dict]:
+async def get_trial_details(nct_id: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict]:
     """
     Get detailed information for a specific trial
 
     Args:
         nct_id: Clinical trial NCT ID
+        client: HTTP client to use, defaults to the shared app-wide client
 
     Returns:
         Detailed trial information or None
     """
 
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.get(
-                f"https://clinicaltrials.gov/api/v2/studies/{nct_id}",
-                params={"format": "json"}
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            return data.get("protocolSection", {})
+        data = await fetch_study(nct_id, client, fields=None)
+        return data.get("protocolSection", {})
 
     except Exception as e:
         logger.error(f"Failed to get trial details for {nct_id}: {str(e)}")
         return None
 
 
+async def fetch_study(nct_id: str, client: Optional[httpx.AsyncClient] = None,
+                      fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict:
+    """
+    Fetch the raw API record for one study, sharing concurrent requests for the same NCT ID
+
+    Args:
+        nct_id: Clinical trial NCT ID
+        client: HTTP client to use, defaults to the shared app-wide client
+        fields: Field projection, defaults to what the enrichment step reads; None for the full record
+
+    Returns:
+        Raw study JSON (raises on HTTP errors)
+    """
+    client = client or get_http_client()
+    params = {"format": "json"}
+    fields_param = format_fields(fields)
+    if fields_param:
+        params["fields"] = fields_param
+
+    async def _fetch() -> Dict:
+        # An attempt slower than the recent latency percentile gets a hedged duplicate
+        response = await get_with_retries(
+            f"{CTGOV_API_BASE}/studies/{nct_id}",
+            params=params,
+            client=client,
+            hedger=study_hedger,
+            timeout=15
+        )
+        return response.json()
+
+    return await study_flight.do(make_cache_key(nct_id, fields_param), _fetch)
+
+
+async def fetch_studies_by_ids(nct_ids: List[str], client: Optional[httpx.AsyncClient] = None,
+                               fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+    """
+    Fetch many studies in one request per BULK_FETCH_CHUNK_SIZE IDs using filter.ids
+
+    IDs the bulk response does not return (or whole chunks whose bulk request
+    failed) fall back to individual /studies/{nct_id} calls.
+
+    Args:
+        nct_ids: Clinical trial NCT IDs
+        client: HTTP client to use, defaults to the shared app-wide client
+        fields: Field projection, defaults to what the enrichment step reads; None for full records
+
+    Returns:
+        Dictionary mapping NCT ID to raw study JSON (IDs that could not be fetched are absent)
+    """
+    client = client or get_http_client()
+    unique_ids = list(dict.fromkeys(nct_id for nct_id in nct_ids if nct_id))
+    if not unique_ids:
+        return {}
+
+    # The response has to carry nctId to be matched back to the request
+    if fields and not any(field in fields for field in (
+            "protocolSection", "protocolSection.identificationModule",
+            "protocolSection.identificationModule.nctId")):
+        fields = tuple(fields) + ("protocolSection.identificationModule.nctId",)
+    fields_param = format_fields(fields)
+
+    async def fetch_chunk(chunk: List[str]) -> List[Dict]:
+        params = {
+            "filter.ids": ",".join(chunk),
+            "pageSize": len(chunk),
+            "format": "json"
+        }
+        if fields_param:
+            params["fields"] = fields_param
+
+        try:
+            response = await get_with_retries(f"{CTGOV_API_BASE}/studies", params=params, client=client)
+            return response.json().get("studies", [])
+        except Exception as e:
+            logger.error(f"Bulk fetch of {len(chunk)} studies failed, falling back to per-ID calls: {str(e)}")
+            return []
+
+    chunks = [unique_ids[i:i + BULK_FETCH_CHUNK_SIZE] for i in range(0, len(unique_ids), BULK_FETCH_CHUNK_SIZE)]
+    chunk_results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+
+    studies_by_id = {}
+    for studies in chunk_results:
+        for study in studies:
+            nct_id = extract_nct_id(study)
+            if nct_id:
+                studies_by_id[nct_id] = study
+
+    missing_ids = [nct_id for nct_id in unique_ids if nct_id not in studies_by_id]
+    if missing_ids and upstream_breaker.is_open:
+        logger.warning(f"Upstream circuit open, skipping per-ID fetch of {len(missing_ids)} studies")
+    elif missing_ids:
+        logger.info(f"Bulk fetch returned {len(studies_by_id)}/{len(unique_ids)} studies, "
+                    f"fetching {len(missing_ids)} individually")
+        results = await asyncio.gather(
+            *[fetch_study(nct_id, client, fields=fields) for nct_id in missing_ids],
+            return_exceptions=True
+        )
+        for nct_id, result in zip(missing_ids, results):
+            if isinstance(result, dict) and result:
+                studies_by_id[nct_id] = result
+            elif isinstance(result, Exception):
+                logger.error(f"Failed to get trial details for {nct_id}: {str(result)}")
+
+    return studies_by_id
+
+
 async def search_trials_with_geo_filter(
         condition: str,
         country: str = "United States",
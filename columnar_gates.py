@@ -0,0 +1,76 @@
+"""
+Columnar evaluation of the numeric hard eligibility gates
+A batch of candidate trials is laid out as NumPy arrays (age limits, sex,
+admitted ECOG levels, interventional flag) straight from their cached
+TrialFeatures, so the age / sex / ECOG / study-type gates become a few
+vectorized comparisons over the whole batch; only the text gates still run
+per trial
+
+Uses the optional `numpy` package; without it (or for small batches) the
+gates run per trial in match_logic
+"""
+
+import importlib.util
+import os
+from typing import Optional, Sequence, Tuple
+
+from trial_features import SEX_CODES, SEX_UNKNOWN, TrialFeatures
+
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# Batches smaller than this are gated per trial (array setup would dominate)
+COLUMNAR_GATES_MIN_BATCH = int(os.getenv("COLUMNAR_GATES_MIN_BATCH", "256"))
+
+
+def columnar_gates_enabled(batch_size: int) -> bool:
+    """Whether a batch of this size should be gated with arrays"""
+    return NUMPY_AVAILABLE and batch_size >= COLUMNAR_GATES_MIN_BATCH
+
+
+class TrialColumns:
+    """
+    Numeric gate inputs of a batch of trials, one array element per trial
+
+    Built from the precomputed TrialFeatures.gate_row of each trial:
+    min_age / max_age: limits in years, open ends filled with 0 / 150
+    sex: trial_features.SEX_CODES of the trial's restriction
+    ecog_admits: bitmask of the admitted ECOG levels; the ECOG gate is not a
+        single ceiling (exclusion criteria can rule out individual levels),
+        so every admitted level is kept
+    interventional: TrialFeatures.interventional
+    """
+
+    __slots__ = ("min_age", "max_age", "sex", "ecog_admits", "interventional")
+
+    def __init__(self, features: Sequence[TrialFeatures]):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("TrialColumns requires numpy; check columnar_gates_enabled() before building one")
+        rows = np.array([item.gate_row for item in features], dtype=np.float64).reshape(len(features), 5)
+        self.min_age = rows[:, 0]
+        self.max_age = rows[:, 1]
+        self.sex = rows[:, 2].astype(np.int8)
+        self.ecog_admits = rows[:, 3].astype(np.uint8)
+        self.interventional = rows[:, 4].astype(np.bool_)
+
+    def __len__(self) -> int:
+        return len(self.min_age)
+
+    def gate_mask(self, age_range: Tuple[float, float], sex: str, ecog: Optional[int]) -> "np.ndarray":
+        """
+        Boolean mask of the trials passing the age, sex, ECOG and study-type gates
+
+        Args:
+            age_range: Patient's (min, max) age in years
+            sex: Patient's normalized sex (MALE / FEMALE / ALL)
+            ecog: Patient's ECOG level (0-4), None when unknown
+        """
+        user_min, user_max = age_range
+        mask = (self.min_age <= user_max) & (self.max_age >= user_min)
+        # An unrecognized trial restriction never equals a patient's code
+        mask &= (self.sex == SEX_CODES["ALL"]) | (self.sex == SEX_CODES.get(sex, SEX_UNKNOWN - 1))
+        if ecog is not None:
+            mask &= (self.ecog_admits & (1 << ecog)) != 0
+        mask &= self.interventional
+        return mask
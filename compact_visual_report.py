@@ -3,6 +3,9 @@ from models import QuestionnaireInput
 from match_logic import build_initial_trial_pool
 from scoring_engine import score_trial, categorize_trials_by_score
 from enhanced_data_extraction import get_detailed_trials_batch, enhance_scored_trial_with_details
+from trial_index import TrialIndex
+from request_context import RequestContext
+from trial_sources import get_trial_source
 
 # Import our new modular components
 from visual_report_data import (
@@ -17,17 +20,21 @@ from visual_report_html import (
 from visual_report_css import get_all_styles
 
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
 
 
-async def generate_compact_visual_report(user_input: QuestionnaireInput) -> str:
+async def generate_compact_visual_report(user_input: QuestionnaireInput,
+                                         context: Optional[RequestContext] = None) -> str:
     """
     Generate compact visual HTML report with charts and radar diagrams
+    (bounded by the request deadline; a partial report says so in its header)
     """
+    context = context or RequestContext()
 
     # Step 1: Get enhanced trial data
-    trials = await build_initial_trial_pool(user_input)
+    source = get_trial_source()
+    trials = await build_initial_trial_pool(user_input, context, source=source)
     scored_trials = [score_trial(trial, user_input) for trial in trials]
     scored_trials.sort(key=lambda x: x.get("score_percent", 0), reverse=True)
 
@@ -36,7 +43,9 @@ async def generate_compact_visual_report(user_input: QuestionnaireInput) -> str:
     nct_ids = [trial["nct_id"] for trial in top_trials if trial.get("nct_id")]
 
     if nct_ids:
-        detailed_trials_info = await get_detailed_trials_batch(nct_ids)
+        detailed_trials_info = await get_detailed_trials_batch(
+            nct_ids, source=source, trial_index=TrialIndex.from_trials(trials, source.search_fields), context=context
+        )
         detailed_info_lookup = {info["nct_id"]: info for info in detailed_trials_info if info.get("nct_id")}
 
         enhanced_top_trials = []
@@ -64,7 +73,10 @@ async def generate_compact_visual_report(user_input: QuestionnaireInput) -> str:
         "possible_matches": len(categorized_results["possible_matches"]),
         "low_matches": len(categorized_results["low_matches"]),
         "detailed_info_available": len([t for t in enhanced_top_trials if t.get("locations")]),
-        "best_match_score": max([t.get('score_percent', 0) for t in categorized_results['high_priority']] + [0])
+        "best_match_score": max([t.get('score_percent', 0) for t in categorized_results['high_priority']] + [0]),
+        "partial": context.partial,
+        "skipped_queries": context.skipped_queries,
+        "stale": context.stale
     }
 
     # Step 4: Generate all data structures
@@ -141,6 +153,19 @@ def generate_compact_visual_html_template(user_input: QuestionnaireInput, catego
     # Get CSS styles from separate module
     css_styles = get_all_styles()
 
+    # Notice for reports cut short by the request deadline
+    partial_notice_html = ""
+    if search_stats.get("partial"):
+        partial_notice_html = (
+            '<p style="font-size: 0.9em; opacity: 0.85;">⏱️ Partial results: some searches did not finish in time '
+            f'({len(search_stats.get("skipped_queries", []))} queries skipped)</p>'
+        )
+    if search_stats.get("stale"):
+        partial_notice_html += (
+            '<p style="font-size: 0.9em; opacity: 0.85;">🕘 Some results come from an earlier search '
+            'because ClinicalTrials.gov is temporarily unavailable</p>'
+        )
+
     # Build the HTML template
     html_template = f"""<!DOCTYPE html>
 <html lang="en">
@@ -164,6 +189,7 @@ def generate_compact_visual_html_template(user_input: QuestionnaireInput, catego
         <div class="header">
             <h1>🎯 Clinical Trial Matching Report</h1>
             <p>Compact Visual Report | Generated on {current_date} at {current_time}</p>
+            {partial_notice_html}
         </div>
 
         <!-- Visual Summary with Charts -->
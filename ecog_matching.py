@@ -0,0 +1,133 @@
+"""
+ECOG / performance-status requirements extracted from eligibility criteria
+The pattern bank is compiled once at import; each criteria text is scanned
+in a single pass per trial, and the result is shared by the eligibility
+gate and the scoring engine
+"""
+
+import re
+from typing import FrozenSet, Optional
+
+# Highest ECOG grade a patient can report ("≥3" and "不清楚" map here too)
+MAX_ECOG_LEVEL = 4
+
+_ECOG_LEVELS = range(MAX_ECOG_LEVEL + 1)
+
+
+def _mentions_performance_status(text: str) -> bool:
+    """Cheap substring check so texts without any anchor skip the regex scan"""
+    return "ecog" in text or "performance" in text
+
+
+def _optional(lookahead: str) -> str:
+    """Zero-width group that captures when lookahead matches and is skipped otherwise"""
+    return f"(?:(?={lookahead})|)"
+
+
+# Inclusion criteria: each anchor word ("ecog" / "performance") is matched
+# once, and optional lookaheads capture every threshold that follows it
+# within the windows the original one-off patterns used. Texts are
+# lowercased before matching: case-sensitive literal anchors let the regex
+# engine skip ahead much faster than IGNORECASE alternations.
+_INCLUSION_RE = re.compile(
+    "ecog"
+    + _optional(r".{0,15}[≤<=]\s*([0-3])")                  # "ECOG ≤ 1"
+    + _optional(r".{0,15}(\d)\s*or\s*less")                  # "ECOG 2 or less"
+    + _optional(r"(.{0,15}[≤<=]\s*[3-4])")                   # "ECOG ≤ 3": accepts ECOG 3+
+    + "|performance"
+    + _optional(r".{0,25}status.{0,15}[≤<=]\s*([0-3])")     # "performance status ≤ 1"
+)
+
+# Exclusion criteria: one capture per ECOG level, "ECOG ≥ n" / "performance status ≥ n"
+_EXCLUSION_RE = re.compile(
+    "ecog"
+    + "".join(_optional(rf"(.{{0,15}}[≥>=]\s*{level})") for level in _ECOG_LEVELS)
+    + "|performance"
+    + "".join(_optional(rf"(.{{0,25}}status.{{0,15}}[≥>=]\s*{level})") for level in _ECOG_LEVELS)
+)
+
+
+class EcogRequirements:
+    """
+    Performance-status limits stated by one trial
+
+    ecog_max / performance_status_max / or_less_max: upper bound from the
+    first "ECOG ≤ n", "performance status ≤ n" and "ECOG n or less" phrase
+    in the inclusion criteria (None when absent).
+    excluded_levels: ECOG levels the exclusion criteria rule out ("ECOG ≥ n").
+    allows_high: the inclusion criteria accept ECOG 3-4 ("ECOG ≤ 3").
+    """
+
+    __slots__ = ("ecog_max", "performance_status_max", "or_less_max", "excluded_levels", "allows_high")
+
+    def __init__(self, ecog_max: Optional[int] = None, performance_status_max: Optional[int] = None,
+                 or_less_max: Optional[int] = None, excluded_levels: FrozenSet[int] = frozenset(),
+                 allows_high: bool = False):
+        self.ecog_max = ecog_max
+        self.performance_status_max = performance_status_max
+        self.or_less_max = or_less_max
+        self.excluded_levels = excluded_levels
+        self.allows_high = allows_high
+
+    @property
+    def trial_max_ecog(self) -> Optional[int]:
+        """Highest ECOG the inclusion criteria accept, as used for scoring"""
+        return self.ecog_max if self.ecog_max is not None else self.performance_status_max
+
+    def admitted_levels(self) -> int:
+        """Bitmask of the ECOG levels admits() accepts (bit n set: ECOG n passes)"""
+        return sum(1 << level for level in _ECOG_LEVELS if self.admits(level))
+
+    def admits(self, level: int) -> bool:
+        """Hard gate: False only when the criteria clearly rule this ECOG level out"""
+        for required_max in (self.ecog_max, self.performance_status_max, self.or_less_max):
+            if required_max is not None and level > required_max:
+                return False  # above a stated maximum
+        if level in self.excluded_levels:
+            return False  # explicitly excluded
+        # ECOG 3+ only passes trials that explicitly accept it
+        return level < 3 or self.allows_high
+
+
+def extract_ecog_requirements(inclusion: str, exclusion: str) -> EcogRequirements:
+    """
+    Scan criteria text for every ECOG / performance-status threshold at once
+
+    Patient-independent, so the gate and the scorer share one result per
+    trial (kept in TrialFeatures). Matching is case-insensitive.
+    """
+    inclusion = inclusion.lower()
+    exclusion = exclusion.lower()
+    ecog_max = performance_status_max = or_less_max = None
+    allows_high = False
+    for match in _INCLUSION_RE.finditer(inclusion) if _mentions_performance_status(inclusion) else ():
+        at_most, or_less, high, status_at_most = match.groups()
+        if ecog_max is None and at_most is not None:
+            ecog_max = int(at_most)
+        if or_less_max is None and or_less is not None:
+            or_less_max = int(or_less)
+        if performance_status_max is None and status_at_most is not None:
+            performance_status_max = int(status_at_most)
+        allows_high = allows_high or high is not None
+
+    levels = len(_ECOG_LEVELS)
+    excluded_levels = set()
+    for match in _EXCLUSION_RE.finditer(exclusion) if _mentions_performance_status(exclusion) else ():
+        groups = match.groups()
+        for level in _ECOG_LEVELS:
+            if groups[level] is not None or groups[levels + level] is not None:
+                excluded_levels.add(level)
+
+    return EcogRequirements(ecog_max, performance_status_max, or_less_max,
+                            frozenset(excluded_levels), allows_high)
+
+
+def ecog_level(ecog_score: str) -> int:
+    """
+    Patient's ECOG as a number (0-4)
+
+    "≥3", "不清楚" and other non-numeric answers count as 4, the worst
+    grade a living patient can have.
+    """
+    digits = ecog_score.replace("+", "")
+    return min(int(digits), MAX_ECOG_LEVEL) if digits.isdigit() else MAX_ECOG_LEVEL
@@ -1,25 +1,23 @@
 import httpx
 import asyncio
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 
+from clinicaltrials_api import fetch_study, DETAIL_FIELDS
+from trial_sources import TrialSource, get_trial_source
+from trial_index import TrialIndex
+from request_context import RequestContext
+
 logger = logging.getLogger(__name__)
 
 
-async def get_detailed_trial_info(nct_id: str) -> Optional[Dict]:
+async def get_detailed_trial_info(nct_id: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict]:
     """
     Get basic trial information that's guaranteed to work
     """
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.get(
-                f"https://clinicaltrials.gov/api/v2/studies/{nct_id}",
-                params={"format": "json"}
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            return extract_basic_trial_data(data)
+        data = await fetch_study(nct_id, client, fields=DETAIL_FIELDS)
+        return extract_basic_trial_data(data)
 
     except Exception as e:
         logger.error(f"Failed to get detailed trial info for {nct_id}: {str(e)}")
@@ -214,19 +212,54 @@ def format_address_safe(facility) -> str:
 
 
 # Enhanced function to get multiple trials with detailed info
-async def get_detailed_trials_batch(nct_ids: List[str]) -> List[Dict]:
+async def get_detailed_trials_batch(nct_ids: List[str], source: Optional[TrialSource] = None,
+                                    trial_index: Optional[TrialIndex] = None,
+                                    context: Optional[RequestContext] = None) -> List[Dict]:
     """
-    Get detailed information for multiple trials in parallel
+    Get detailed information for multiple trials, reusing what the search already downloaded
+
+    Only the detail fields missing from trial_index (typically descriptions and
+    contacts/locations, which the lean search projection leaves out) are fetched,
+    with one bulk request per distinct set of missing fields. If the request
+    deadline in context passes first, trials are built from what was loaded so far.
+    Studies come from source, defaulting to the configured TRIAL_DATA_SOURCE.
     """
-    tasks = [get_detailed_trial_info(nct_id) for nct_id in nct_ids]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    source = source or get_trial_source()
+    trial_index = trial_index if trial_index is not None else TrialIndex()
+
+    # Group trials by which detail fields they still need
+    missing_groups: Dict[Tuple[str, ...], List[str]] = {}
+    for nct_id in nct_ids:
+        missing = trial_index.missing_fields(nct_id, DETAIL_FIELDS)
+        if missing:
+            missing_groups.setdefault(missing, []).append(nct_id)
+
+    async def fetch_group(missing: Tuple[str, ...], group_ids: List[str]) -> None:
+        studies_by_id = await source.get_by_ids(group_ids, fields=missing)
+        fetched_fields = None if source.full_records else missing
+
+        for nct_id, study in studies_by_id.items():
+            trial_index.merge(nct_id, study, fetched_fields)
+
+    if missing_groups:
+        fetch_all = asyncio.gather(*(fetch_group(missing, group_ids) for missing, group_ids in missing_groups.items()))
+        if context is not None:
+            await context.run(fetch_all, "detail_enrichment")
+        else:
+            await fetch_all
+
+    reused = len(nct_ids) - sum(len(group_ids) for group_ids in missing_groups.values())
+    logger.info(f"Detail enrichment: {reused} trials fully served from search payloads, "
+                f"{len(nct_ids) - reused} needed {len(missing_groups)} bulk fetch(es)")
 
     detailed_trials = []
-    for result in results:
-        if isinstance(result, dict) and result:  # Valid result
-            detailed_trials.append(result)
-        elif isinstance(result, Exception):
-            logger.error(f"Failed to get trial details: {str(result)}")
+    for nct_id in nct_ids:
+        study = trial_index.get(nct_id)
+        if not study:
+            continue
+        detailed_info = extract_basic_trial_data(study)
+        if detailed_info:  # Valid result
+            detailed_trials.append(detailed_info)
 
     return detailed_trials
 
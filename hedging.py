@@ -0,0 +1,156 @@
+"""
+Hedged requests for per-study detail fetches
+If a network attempt is slower than the recent latency percentile, a
+duplicate is sent and whichever answers first wins; hedges are capped to a
+fraction of traffic so they cannot amplify an upstream slowdown. Only the
+attempt itself is timed and raced (see api_client.get_with_retries), never
+rate-limiter queueing or retry backoff, which a duplicate could not beat
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv("CTGOV_HEDGE", "1").lower() not in ("0", "false", "no")
+HEDGE_PERCENTILE = float(os.getenv("CTGOV_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_FRACTION = float(os.getenv("CTGOV_HEDGE_MAX_FRACTION", "0.05"))   # hedges / requests
+HEDGE_MIN_SAMPLES = int(os.getenv("CTGOV_HEDGE_MIN_SAMPLES", "20"))         # before the percentile is trusted
+HEDGE_MIN_DELAY = float(os.getenv("CTGOV_HEDGE_MIN_DELAY", "0.05"))         # seconds
+HEDGE_WINDOW = 500                                                          # latencies kept
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies"""
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int = HEDGE_MIN_SAMPLES) -> Optional[float]:
+        """Nearest-rank percentile, None until enough samples were seen"""
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+class Hedger:
+    """
+    Run a request, and once it has been outstanding for the tracked latency
+    percentile, race a duplicate against it
+
+    Duplicates are capped at max_fraction of all requests; over budget, the
+    request just keeps waiting. If the first response is an error, the
+    other attempt is still awaited.
+    """
+
+    def __init__(self, name: str, percentile: float = HEDGE_PERCENTILE,
+                 max_fraction: float = HEDGE_MAX_FRACTION, enabled: bool = HEDGE_ENABLED):
+        self.name = name
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.enabled = enabled
+        self.latency = LatencyTracker()
+
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        delay = self.latency.percentile(self.percentile)
+        return None if delay is None else max(HEDGE_MIN_DELAY, delay)
+
+    def _within_budget(self) -> bool:
+        return self.hedges_sent + 1 <= self.max_fraction * self.requests
+
+    async def _timed(self, call: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await call()
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _hedge(self, call: Callable[[], Awaitable[T]], admit: Optional[Callable[[], Awaitable[Any]]]) -> T:
+        if admit is not None:
+            await admit()
+        return await self._timed(call)
+
+    async def run(self, call: Callable[[], Awaitable[T]],
+                  admit: Optional[Callable[[], Awaitable[Any]]] = None) -> T:
+        """
+        Args:
+            call: Zero-argument coroutine factory for one network attempt;
+                  called a second time for the hedge
+            admit: Awaited before the hedge is sent (e.g. a rate limiter token)
+
+        Returns:
+            The first successful result (raises the primary's error if both fail)
+        """
+        self.requests += 1
+        delay = self.hedge_delay() if self.enabled else None
+        if delay is None:
+            return await self._timed(call)
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._timed(call))
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                return primary.result()
+
+            if not self._within_budget():
+                self.over_budget += 1
+                return await primary
+
+            self.hedges_sent += 1
+            logger.debug(f"{self.name}: request exceeded p{self.percentile:g} ({delay:.3f}s), sending hedge")
+            hedge = asyncio.ensure_future(self._hedge(call, admit))
+            attempts.append(hedge)
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+
+            return primary.result()  # both failed
+        finally:
+            # Keep the slow tail in the window even when the hedge won, so the
+            # percentile is not dragged down by hedging itself
+            if not primary.done():
+                self.latency.record(time.monotonic() - started)
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "over_budget": self.over_budget,
+            "hedge_rate": round(self.hedges_sent / self.requests, 4) if self.requests else 0.0,
+            "hedge_delay_seconds": round(delay, 3) if delay is not None else None,
+        }
+
+
+# Per-ID detail fetches (bulk filter.ids chunks are not hedged: a duplicate
+# of a 100-study request costs far more than it can save)
+study_hedger = Hedger("study_detail")
@@ -0,0 +1,227 @@
+"""
+Incremental parser for ClinicalTrials.gov study pages
+Yields studies one at a time as response chunks arrive, so a 1000-study
+page never has to be materialized as a whole
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterator, Optional, Union
+
+_WHITESPACE = " \t\n\r"
+_STRUCTURE_RE = re.compile(r'[\[\]{}"]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+
+class StudyStreamParser:
+    """
+    Push parser for a JSON object holding one large array of studies
+
+    Feed raw response chunks with feed(); each call returns an iterator of
+    the array items completed so far. Every other top-level value (for example
+    nextPageToken or totalCount) is collected in `fields`. A document that is
+    itself a top-level array (a full-dataset download) is streamed the same way.
+
+    Only the unparsed tail of the input is buffered, so memory stays bounded by
+    the largest single study rather than the page. A study split over many
+    chunks is only decoded once its closing bracket has arrived: new input is
+    scanned for brackets and strings, resuming where the previous chunk
+    stopped, so the work stays linear in the study size.
+    """
+
+    def __init__(self, array_key: Optional[str] = "studies"):
+        self.array_key = array_key
+        self.fields: Dict[str, Any] = {}
+        self.items_parsed = 0
+
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._top_level_array = False
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+        # Bracket scan of an object/array value that is still incomplete
+        self._scan_offset = 0
+        self._scan_depth = 0
+        self._scan_in_string = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: Union[bytes, str]) -> Iterator[Dict]:
+        """Add a chunk of the document and iterate over newly completed items"""
+        text = self._utf8.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return self._parse(final=False)
+
+    def close(self) -> Iterator[Dict]:
+        """Signal end of input; iterates over any remaining items and validates the document"""
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(b"", final=True)
+        self._pos = 0
+        yield from self._parse(final=True)
+
+        if self._state != "done":
+            raise ValueError("Truncated JSON document in study stream")
+
+    def _skip_whitespace(self, pos: int) -> int:
+        buffer = self._buffer
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def _reset_scan(self) -> None:
+        self._scan_offset = 0
+        self._scan_depth = 0
+        self._scan_in_string = False
+
+    def _container_complete(self, start: int) -> bool:
+        """
+        Whether the object/array starting at start has been closed in the buffer
+
+        Scans only input not seen by earlier calls (offsets are kept relative
+        to start, which survives the buffer being rebased in feed()).
+        """
+        buffer = self._buffer
+        end = len(buffer)
+        pos = start + self._scan_offset
+        depth = self._scan_depth
+        in_string = self._scan_in_string
+
+        while pos < end:
+            if in_string:
+                match = _STRING_END_RE.search(buffer, pos)
+                if match is None:
+                    pos = end
+                elif match.group() == "\\":
+                    if match.end() >= end:
+                        pos = match.start()  # the escaped character is in the next chunk
+                        break
+                    pos = match.end() + 1
+                else:
+                    in_string = False
+                    pos = match.end()
+                continue
+
+            match = _STRUCTURE_RE.search(buffer, pos)
+            if match is None:
+                pos = end
+                continue
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self._reset_scan()
+                    return True
+
+        self._scan_offset = pos - start
+        self._scan_depth = depth
+        self._scan_in_string = in_string
+        return False
+
+    def _decode(self, pos: int, final: bool):
+        """
+        Decode one JSON value at pos; returns None when more input is needed
+        """
+        # Objects and arrays are only handed to the decoder once complete
+        if not final and self._buffer[pos] in "{[" and not self._container_complete(pos):
+            return None
+
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+
+        # A bare number at the end of the buffer may continue in the next chunk
+        if not final and end >= len(self._buffer) and self._buffer[end - 1] not in '}]"':
+            return None
+        return value, end
+
+    def _parse(self, final: bool) -> Iterator[Dict]:
+        while True:
+            pos = self._skip_whitespace(self._pos)
+            if pos >= len(self._buffer):
+                self._pos = pos
+                return
+
+            char = self._buffer[pos]
+
+            if self._state == "start":
+                if char == "{":
+                    self._state = "key"
+                elif char == "[":
+                    self._state = "array"
+                    self._top_level_array = True
+                else:
+                    raise ValueError(f"Unexpected character {char!r} at start of study stream")
+                self._pos = pos + 1
+
+            elif self._state == "key":
+                if char == ",":
+                    self._pos = pos + 1
+                    continue
+                if char == "}":
+                    self._state = "done"
+                    self._pos = pos + 1
+                    continue
+
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return
+                key, end = decoded
+                colon = self._skip_whitespace(end)
+                if colon >= len(self._buffer):
+                    if final:
+                        raise ValueError("Truncated JSON document in study stream")
+                    return
+                if not isinstance(key, str) or self._buffer[colon] != ":":
+                    raise ValueError(f"Malformed object key at offset {pos} of study stream")
+
+                self._key = key
+                self._state = "value"
+                self._pos = colon + 1
+
+            elif self._state == "value":
+                if self._key == self.array_key and char == "[":
+                    self._state = "array"
+                    self._pos = pos + 1
+                    continue
+
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return
+                value, end = decoded
+                self.fields[self._key] = value
+                self._state = "key"
+                self._pos = end
+
+            elif self._state == "array":
+                if char == ",":
+                    self._pos = pos + 1
+                    continue
+                if char == "]":
+                    self._state = "done" if self._top_level_array else "key"
+                    self._pos = pos + 1
+                    continue
+
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return
+                item, end = decoded
+                self._pos = end
+                self.items_parsed += 1
+                yield item
+
+            else:
+                raise ValueError(f"Unexpected trailing data {char!r} after study stream")
@@ -0,0 +1,52 @@
+"""
+Multi-keyword matching in one pass over a text
+All keywords go into one Aho-Corasick automaton, so finding every keyword in
+a title or criteria text costs a single scan of the text instead of one
+substring search per keyword
+
+Uses the optional `pyahocorasick` package; without it matching falls back
+to one substring search per keyword
+"""
+
+import importlib.util
+import logging
+from typing import FrozenSet, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+AHOCORASICK_AVAILABLE = importlib.util.find_spec("ahocorasick") is not None
+if AHOCORASICK_AVAILABLE:
+    import ahocorasick
+
+
+class KeywordMatcher:
+    """
+    Automaton over a fixed keyword list
+
+    find() returns every keyword that occurs in the text as a substring
+    (the same hits as `keyword in text` for each keyword, overlaps
+    included), in time linear in the text length. Matching is
+    case-sensitive; keywords and texts are expected lowercased.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        elif not AHOCORASICK_AVAILABLE:
+            logger.info("pyahocorasick is not installed, keyword matching falls back to per-keyword scans")
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """Set of keywords occurring in text"""
+        if not text:
+            return frozenset()
+        if self._automaton is not None:
+            return frozenset(keyword for _, keyword in self._automaton.iter(text))
+        return frozenset(keyword for keyword in self.keywords if keyword in text)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
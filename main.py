@@ -4,11 +4,34 @@ from models import QuestionnaireInput
 from match_logic import build_initial_trial_pool
 from scoring_engine import score_trial, categorize_trials_by_score
 from enhanced_data_extraction import get_detailed_trials_batch, enhance_scored_trial_with_details
+from trial_index import TrialIndex, study_cache
+from trial_features import feature_cache
 from compact_visual_report import generate_compact_visual_report
+from api_client import start_http_client, close_http_client
+from query_cache import search_cache
+from singleflight import search_flight, study_flight
+from rate_limiter import rate_limiter
+from request_context import RequestContext
+from trial_sources import get_trial_source
+from circuit_breaker import upstream_breaker
+from hedging import study_hedger
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi.responses import HTMLResponse
-app = FastAPI(title="Clinical Trial Match Report API", version="0.2")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    App lifespan - one pooled HTTP client shared by every ClinicalTrials.gov call
+    """
+    await start_http_client()
+    yield
+    await close_http_client()
+
+
+app = FastAPI(title="Clinical Trial Match Report API", version="0.2", lifespan=lifespan)
 
 
 @app.get("/")
@@ -16,15 +39,37 @@ async def root():
     return {"message": "Welcome to MatchReport API v0.2 - Now with enhanced trial details!"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics for the upstream data path
+    """
+    return {
+        "rate_limiter": rate_limiter.stats(),
+        "circuit_breaker": upstream_breaker.stats(),
+        "search_cache": search_cache.stats(),
+        "search_flight": search_flight.stats(),
+        "study_flight": study_flight.stats(),
+        "study_cache": study_cache.stats() if study_cache is not None else None,
+        "feature_cache": feature_cache.stats() if feature_cache is not None else None,
+        "hedging": {"study_detail": study_hedger.stats()}
+    }
+
+
 @app.post("/match_trials")
 async def match_trials(user_input: QuestionnaireInput):
     """
     Enhanced endpoint that returns comprehensive trial matching results
     with detailed facility and contact information
+
+    Bounded by MATCH_REQUEST_DEADLINE: whatever is unfinished at the deadline is
+    dropped and the response is marked partial
     """
+    context = RequestContext()
 
     # Step 1: Get the initial trial pool (your existing logic)
-    trials = await build_initial_trial_pool(user_input)
+    source = get_trial_source()
+    trials = await build_initial_trial_pool(user_input, context, source=source)
     print(f"🔍 Found {len(trials)} eligible trials after filtering")
 
     # Step 2: Score each trial (your existing logic)
@@ -43,7 +88,9 @@ async def match_trials(user_input: QuestionnaireInput):
         print(f"📋 Getting detailed information for top {len(nct_ids)} trials...")
 
         # Step 5: Get detailed information in parallel - NEW!
-        detailed_trials_info = await get_detailed_trials_batch(nct_ids)
+        detailed_trials_info = await get_detailed_trials_batch(
+            nct_ids, source=source, trial_index=TrialIndex.from_trials(trials, source.search_fields), context=context
+        )
 
         # Step 6: Create lookup dictionary for detailed info
         detailed_info_lookup = {
@@ -85,6 +132,11 @@ async def match_trials(user_input: QuestionnaireInput):
             "detailed_info_available": len([t for t in enhanced_top_trials if t.get("locations")])
         },
         "results_by_category": categorized_results,
+        "partial": context.partial,
+        "skipped_queries": context.skipped_queries,
+        "degraded_steps": context.degraded_steps,
+        "stale": context.stale,
+        "stale_queries": context.stale_queries,
         "generation_timestamp": datetime.now().isoformat(),
         "report_metadata": {
             "version": "2.0",
@@ -99,14 +151,18 @@ async def match_trials_basic(user_input: QuestionnaireInput):
     """
     Basic endpoint without detailed contact info (faster)
     """
-    trials = await build_initial_trial_pool(user_input)
+    context = RequestContext()
+    trials = await build_initial_trial_pool(user_input, context)
     scored = [score_trial(t, user_input) for t in trials]
     scored.sort(key=lambda x: x.get("score_percent", 0), reverse=True)
 
     return {
         "match_pool_size": len(scored),
         "results": scored,
-        "patient_summary": generate_patient_summary(user_input)
+        "patient_summary": generate_patient_summary(user_input),
+        "partial": context.partial,
+        "skipped_queries": context.skipped_queries,
+        "stale": context.stale
     }
 
 
@@ -1,102 +1,174 @@
-from clinicaltrials_api import search_trials_basic
+from clinicaltrials_api import RELEVANT_STATUSES
+from trial_sources import TrialSource, get_trial_source
+from query_planner import plan_search_strategies
+from search_scheduler import SearchScheduler
+from request_context import RequestContext
 from medical_dictionary import (
     CANCER_SYNONYMS, GENE_DRUG_MAPPING, EXCLUDED_CANCER_TYPES,
-    PAN_CANCER_KEYWORDS, GENE_FOCUSED_KEYWORDS, TREATMENT_STAGE_SYNONYMS,
-    get_cancer_synonyms, get_gene_drugs, is_excluded_cancer,
-    is_pan_cancer_trial, is_gene_focused_trial
+    PAN_CANCER_KEYWORDS, TREATMENT_STAGE_SYNONYMS,
+    INFECTION_EXCLUSION_KEYWORDS, get_cancer_synonyms, get_gene_drugs, is_excluded_cancer
 )
-from utils import parse_age, normalize_gender, extract_nct_id
-from typing import List, Set, Dict
-import asyncio
-import re
-
-
-async def build_initial_trial_pool(user_input) -> list[dict]:
+from ecog_matching import ecog_level
+from trial_features import TrialFeatures, get_trial_features
+from columnar_gates import TrialColumns, columnar_gates_enabled
+from utils import normalize_gender, extract_nct_id
+from contextlib import aclosing
+from typing import List, Set, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 用户年龄组对应的年龄区间（岁）
+AGE_GROUP_RANGES = {
+    "18-39": (18, 39),
+    "40-64": (40, 64),
+    "65+": (65, 100)
+}
+
+
+async def build_initial_trial_pool(user_input, context: Optional[RequestContext] = None,
+                                   source: Optional[TrialSource] = None) -> list[dict]:
     """
     构建预过滤的初步匹配池 - 只包含真正符合基本条件的试验
-    """
-
-    # 1. 构建搜索策略
-    search_strategies = build_search_strategies(user_input)
-
-    # 2. 并行执行搜索
-    all_trials = []
-    search_tasks = []
-
-    for strategy in search_strategies:
-        task = search_trials_basic(strategy["query"], strategy.get("max_results"))
-        search_tasks.append(task)
-
-    search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
 
-    # 3. 合并去重
-    seen_nct_ids = set()
-    raw_trials = []
-
-    for result in search_results:
-        if isinstance(result, list):
-            for trial in result:
+    context: 请求级截止时间；到期后只用已完成的查询结果，未完成或失败的查询记入 context.skipped_queries，
+             上游故障时用过期缓存回答的查询记入 context.stale_queries
+    source: 试验数据源（在线API / 本地镜像 / 录制数据），默认按 TRIAL_DATA_SOURCE 配置
+    """
+    if context is not None:
+        context.activate()
+
+    # 1. 构建搜索策略，并合并为少量 OR 查询（去掉被更宽泛查询覆盖的策略）
+    search_strategies, plan_stats = plan_search_strategies(build_search_strategies(user_input))
+    print(f"🧭 {plan_stats['strategies']} 个搜索策略合并为 {plan_stats['planned_queries']} 个查询，"
+          f"预计节省 {plan_stats['estimated_requests_saved']} 次请求")
+
+    # 2. 按优先级分层执行搜索（数据源: 在线API / 本地镜像 / 录制数据）
+    #    高优先级先跑；池子够大或超出时间预算后，低优先级扩展查询跳过/取消
+    source = source or get_trial_source()
+    scheduler = SearchScheduler(search_strategies, source.search,
+                                deadline=context.search_deadline if context else None)
+
+    # 3. 边完成边合并去重 + 硬性预过滤，不合格的原始试验不再保留
+    #    合格试验按 (策略序号, 结果位置) 排序，保证输出顺序与逐个策略合并时一致
+    rejected_nct_ids = set()
+    eligible_by_id = {}
+
+    async with aclosing(scheduler.results()) as results:
+        async for index, result in results:
+            # 本批新出现的试验: nct_id -> (order_key, trial, features)
+            candidates = {}
+            for position, trial in enumerate(result):
                 nct_id = extract_nct_id(trial)
-                if nct_id and nct_id not in seen_nct_ids:
-                    seen_nct_ids.add(nct_id)
-                    raw_trials.append(trial)
-
-    # 4. 🚨 关键步骤：硬性预过滤 - 只保留真正符合条件的试验
-    eligible_trials = []
-    for trial in raw_trials:
-        if passes_hard_eligibility_gates(trial, user_input):
-            eligible_trials.append(trial)
-
-    print(f"🔍 搜索到 {len(raw_trials)} 个试验，预过滤后剩余 {len(eligible_trials)} 个符合条件的试验")
+                if not nct_id or nct_id in rejected_nct_ids or nct_id in candidates:
+                    continue
+
+                order_key = (index, position)
+                if nct_id in eligible_by_id:
+                    if order_key < eligible_by_id[nct_id][0]:
+                        eligible_by_id[nct_id] = (order_key, trial)
+                    continue
+
+                # 试验特征（文本、年龄、ECOG、关键词）在拿到试验后解析一次，各门槛共用
+                candidates[nct_id] = (order_key, trial, get_trial_features(trial))
+
+            # 4. 🚨 关键步骤：硬性预过滤 - 只保留真正符合条件的试验
+            #    大批量时年龄/性别/ECOG/研究类型门槛用 NumPy 整批向量化计算，逐个试验只跑文本门槛
+            numeric_passed = numeric_gate_mask([features for _, _, features in candidates.values()], user_input)
+            for i, (nct_id, (order_key, trial, features)) in enumerate(candidates.items()):
+                if numeric_passed is None:
+                    eligible = passes_hard_eligibility_gates(trial, user_input, features)
+                else:
+                    eligible = numeric_passed[i] and passes_text_gates(features, user_input)
+                if eligible:
+                    eligible_by_id[nct_id] = (order_key, trial)
+                else:
+                    rejected_nct_ids.add(nct_id)
+
+            scheduler.record(index, len(candidates), len(eligible_by_id))
+
+    eligible_trials = [trial for _, trial in sorted(eligible_by_id.values(), key=lambda item: item[0])]
+    total_unique = len(eligible_by_id) + len(rejected_nct_ids)
+
+    summary = scheduler.summary()
+    if context is not None:
+        for strategy, stats in zip(search_strategies, summary["strategies"]):
+            if stats["status"] in ("deadline", "failed"):
+                context.skip_queries(strategy.get("merged_from", [strategy["query"]]))
+    print(f"🔍 搜索到 {total_unique} 个试验，预过滤后剩余 {len(eligible_trials)} 个符合条件的试验"
+          f"（{summary['completed']} 个查询完成，跳过 {summary['skipped']} 个，取消 {summary['cancelled']} 个，"
+          f"超时未完成 {summary['deadline']} 个，"
+          f"耗时 {summary['elapsed_seconds']}s）")
+    for stats in summary["strategies"]:
+        logger.info(f"Search strategy [{stats['priority']}] {stats['status']}: {stats['query']} -> "
+                    f"{stats['results']} results, {stats['new_unique']} new unique")
 
     return eligible_trials
 
 
-def passes_hard_eligibility_gates(trial: dict, user_input) -> bool:
+def passes_hard_eligibility_gates(trial: dict, user_input, features: Optional[TrialFeatures] = None) -> bool:
     """
     硬性资格门槛检查 - 不符合条件的试验直接排除，不进入评分
-    """
-
-    # 提取试验信息
-    protocol_section = trial.get("protocolSection", {})
-    identification = protocol_section.get("identificationModule", {})
-    eligibility = protocol_section.get("eligibilityModule", {})
 
-    title = identification.get("officialTitle", "").lower()
-    inclusion_criteria = eligibility.get("inclusionCriteria", "").lower()
-    exclusion_criteria = eligibility.get("exclusionCriteria", "").lower()
+    features: 试验的预解析特征（与患者无关），未传入时现场解析
+    """
+    features = features or get_trial_features(trial)
 
     # 门槛1: 癌症类型硬性匹配检查
-    if not passes_cancer_type_gate(title, inclusion_criteria, user_input):
+    if not passes_cancer_type_gate(features, user_input):
         return False
 
     # 门槛2: 年龄硬性限制检查
-    if not passes_age_gate(eligibility, user_input):
+    if not passes_age_gate(features, user_input):
         return False
 
     # 门槛3: 性别硬性限制检查
-    if not passes_gender_gate(eligibility, user_input):
+    if not passes_gender_gate(features, user_input):
         return False
 
     # 门槛4: ECOG硬性限制检查
-    if not passes_ecog_gate(inclusion_criteria, exclusion_criteria, user_input):
+    if not passes_ecog_gate(features, user_input):
         return False
 
     # 门槛5: 严重排除标准检查
-    if has_serious_exclusions(exclusion_criteria, user_input):
+    if has_serious_exclusions(features, user_input):
         return False
 
     # 门槛6: 只要干预治疗试验，排除观察性研究
-    if not is_interventional_trial(trial):
+    if not features.interventional:
         return False
 
     return True
 
 
-def passes_cancer_type_gate(title: str, inclusion: str, user_input) -> bool:
+def passes_text_gates(features: TrialFeatures, user_input) -> bool:
+    """
+    只含文本门槛（门槛1 癌症类型、门槛5 严重排除标准），数值门槛已整批向量化判断过
+    """
+    return passes_cancer_type_gate(features, user_input) and not has_serious_exclusions(features, user_input)
+
+
+def numeric_gate_mask(features: List[TrialFeatures], user_input) -> Optional[List[bool]]:
+    """
+    数值门槛（门槛2 年龄、门槛3 性别、门槛4 ECOG、门槛6 干预试验）的整批结果
+
+    批量足够大且安装了 NumPy 时按列向量化计算；否则返回 None，由调用方逐个试验判断
+    """
+    if not columnar_gates_enabled(len(features)):
+        return None
+
+    ecog = ecog_level(user_input.ecog_score) if user_input.ecog_score else None
+    mask = TrialColumns(features).gate_mask(
+        AGE_GROUP_RANGES.get(user_input.age_group, (0, 150)), normalize_gender(user_input.gender), ecog
+    )
+    return mask.tolist()
+
+
+def passes_cancer_type_gate(features: TrialFeatures, user_input) -> bool:
     """
     门槛1: 癌症类型匹配门槛 - 最严格的过滤
     """
+    title, inclusion = features.title, features.inclusion
     user_cancers = [cancer.lower() for cancer in (user_input.cancer_types or [])]
     user_gene = user_input.gene_mutation.lower() if user_input.gene_mutation else ""
 
@@ -106,125 +178,73 @@ def passes_cancer_type_gate(title: str, inclusion: str, user_input) -> bool:
             return True
 
     # 情况2: 基因导向试验 - 如果用户有基因突变且试验专注该基因
-    if user_gene:
-        # 检查试验是否专注该基因突变 - 使用字典
-        if is_gene_focused_trial(title, inclusion, user_gene):
+    if user_gene and features.gene_focused:
+        # 试验专注该基因突变，或泛基因突变试验的纳入标准包含用户的基因 - 使用字典
+        if user_gene in f"{title} {inclusion}":
             return True
 
-        # 检查是否是泛基因突变试验（针对多种基因突变） - 使用字典
-        if any(keyword in title or keyword in inclusion for keyword in GENE_FOCUSED_KEYWORDS):
-            # 进一步检查是否包含用户的基因
-            if user_gene in inclusion:
-                return True
-
     # 情况3: 泛癌种试验检查 - 使用字典
-    if is_pan_cancer_trial(title, inclusion):
+    if features.pan_cancer:
         return True
 
-    # 情况4: 严格排除明显不相关的癌症类型 - 使用字典
-    for excluded_cancer in EXCLUDED_CANCER_TYPES:
-        if excluded_cancer in title:
-            # 使用字典检查是否应该排除
-            if is_excluded_cancer(excluded_cancer, user_input.cancer_types or []):
-                return False
+    # 情况4: 严格排除明显不相关的癌症类型 - 使用字典（标题关键词已预先扫描）
+    for excluded_cancer in features.title_hits.intersection(EXCLUDED_CANCER_TYPES):
+        # 使用字典检查是否应该排除
+        if is_excluded_cancer(excluded_cancer, user_input.cancer_types or []):
+            return False
 
     # 默认情况：如果无法明确分类，保守地包含（后续评分会处理）
     return True
 
 
-def passes_age_gate(eligibility: dict, user_input) -> bool:
+def passes_age_gate(features: TrialFeatures, user_input) -> bool:
     """
-    门槛2: 年龄硬性限制检查
+    门槛2: 年龄硬性限制检查（试验年龄已统一换算为岁）
     """
-    min_age = eligibility.get("minimumAge", "")
-    max_age = eligibility.get("maximumAge", "")
-
-    if not min_age and not max_age:
+    if features.min_age is None and features.max_age is None:
         return True  # 无年龄限制
 
     # 解析用户年龄组
-    age_ranges = {
-        "18-39": (18, 39),
-        "40-64": (40, 64),
-        "65+": (65, 100)
-    }
+    user_min, user_max = AGE_GROUP_RANGES.get(user_input.age_group, (0, 150))
 
-    user_min, user_max = age_ranges.get(user_input.age_group, (0, 150))
-
-    # 解析试验年龄要求 - 使用utils函数
-    trial_min = parse_age(min_age) if min_age else 0
-    trial_max = parse_age(max_age) if max_age else 150
+    # 试验年龄要求，缺失的一端视为不限
+    trial_min = features.min_age if features.min_age is not None else 0
+    trial_max = features.max_age if features.max_age is not None else 150
 
     # 检查是否有年龄重叠
     return not (user_max < trial_min or user_min > trial_max)
 
 
-def passes_gender_gate(eligibility: dict, user_input) -> bool:
+def passes_gender_gate(features: TrialFeatures, user_input) -> bool:
     """
     门槛3: 性别硬性限制检查
     """
-    trial_gender = eligibility.get("sex", "ALL").upper()
-
-    if trial_gender == "ALL":
+    if features.sex == "ALL":
         return True
 
     # 使用utils函数标准化性别
     user_gender_mapped = normalize_gender(user_input.gender)
 
-    return trial_gender in [user_gender_mapped, "ALL"]
+    return features.sex in [user_gender_mapped, "ALL"]
 
 
-def passes_ecog_gate(inclusion: str, exclusion: str, user_input) -> bool:
+def passes_ecog_gate(features: TrialFeatures, user_input) -> bool:
     """
     门槛4: ECOG硬性限制检查 - 只排除明显不符合的情况
+    （超出纳入标准上限、排除标准明确排除、ECOG 3+ 而试验未明确允许）
     """
     if not user_input.ecog_score:
         return True  # 没有ECOG信息，保守通过
 
-    user_ecog_num = int(user_input.ecog_score.replace("+", "")) if user_input.ecog_score.replace("+",
-                                                                                                 "").isdigit() else 4
-
-    # 查找试验中的ECOG要求
-    ecog_patterns = [
-        r"ecog.{0,15}[≤<=]\s*([0-3])",
-        r"performance.{0,25}status.{0,15}[≤<=]\s*([0-3])",
-        r"ecog.{0,15}(\d)\s*or\s*less",
-        r"ecog.{0,15}0.{0,5}1"  # "ECOG 0-1"
-    ]
-
-    for pattern in ecog_patterns:
-        match = re.search(pattern, inclusion, re.IGNORECASE)
-        if match:
-            try:
-                required_max = int(match.group(1))
-                if user_ecog_num > required_max:
-                    return False  # 明确超出要求，排除
-            except (ValueError, IndexError):
-                continue
-
-    # 检查排除标准中是否明确排除用户的ECOG
-    ecog_exclusion_patterns = [
-        rf"ecog.{{0,15}}[≥>=]\s*{user_ecog_num}",
-        rf"performance.{{0,25}}status.{{0,15}}[≥>=]\s*{user_ecog_num}"
-    ]
-
-    for pattern in ecog_exclusion_patterns:
-        if re.search(pattern, exclusion, re.IGNORECASE):
-            return False  # 明确被排除
-
-    # ECOG 3+ 的患者对大多数试验过于严格
-    if user_ecog_num >= 3:
-        # 除非试验明确允许ECOG 3+，否则排除
-        if not re.search(r"ecog.{0,15}[≤<=]\s*[3-4]", inclusion, re.IGNORECASE):
-            return False
+    # 试验的ECOG要求与患者无关，已在特征中提取，门槛和评分共用
+    return features.ecog.admits(ecog_level(user_input.ecog_score))
 
-    return True
 
-
-def has_serious_exclusions(exclusion: str, user_input) -> bool:
+def has_serious_exclusions(features: TrialFeatures, user_input) -> bool:
     """
     门槛5: 严重排除标准检查
     """
+    exclusion = features.exclusion
     if not exclusion:
         return False
 
@@ -251,111 +271,40 @@ def has_serious_exclusions(exclusion: str, user_input) -> bool:
 
     # 检查活动性感染
     if user_input.active_infection:
-        infection_exclusions = [
-            "active infection", "ongoing infection", "uncontrolled infection",
-            "systemic infection", "serious infection"
-        ]
-
-        if any(ex in exclusion for ex in infection_exclusions):
+        if not features.exclusion_hits.isdisjoint(INFECTION_EXCLUSION_KEYWORDS):
             return True
 
     return False
 
 
-def is_interventional_trial(trial: dict) -> bool:
+def build_query_filters(user_input) -> Dict[str, str]:
     """
-    门槛6: 干预治疗试验过滤 - 只保留有实际治疗干预的试验
+    把硬性门槛下推为服务端过滤参数 - 招募状态、研究类型、性别、年龄
+
+    与本地门槛语义一致（本地门槛仍保留作为兜底），只是让服务端不再返回
+    注定会被丢弃的试验:
+      - 状态: 只要 RECRUITING / NOT_YET_RECRUITING
+      - 研究类型: 排除观察性研究 (门槛6)；未填写研究类型的交给本地门槛判断
+      - 性别: 试验性别为 ALL 或与用户一致 (门槛3)
+      - 年龄: 试验年龄区间与用户年龄组有重叠，未填写年龄限制视为不限 (门槛2)
     """
-    protocol_section = trial.get("protocolSection", {})
-
-    # 方法1: 检查研究设计类型
-    design_info = protocol_section.get("designModule", {})
-    study_type = design_info.get("studyType", "").upper()
-
-    # 直接排除观察性研究
-    if study_type == "OBSERVATIONAL":
-        return False
-
-    # 优先选择干预性研究
-    if study_type == "INTERVENTIONAL":
-        return True
-
-    # 方法2: 检查是否有干预措施
-    arms_info = protocol_section.get("armsInterventionsModule", {})
-    interventions = arms_info.get("interventions", [])
-
-    if interventions:
-        # 检查干预类型
-        for intervention in interventions:
-            intervention_type = intervention.get("type", "").lower()
-
-            # 治疗性干预类型
-            therapeutic_types = [
-                "drug", "biological", "radiation", "procedure",
-                "device", "combination product", "genetic"
-            ]
-
-            if intervention_type in therapeutic_types:
-                return True
-
-    # 方法3: 通过标题关键词判断
-    identification = protocol_section.get("identificationModule", {})
-    title = identification.get("officialTitle", "").lower()
-
-    # 干预治疗关键词
-    intervention_keywords = [
-        "phase i", "phase ii", "phase iii", "phase 1", "phase 2", "phase 3",
-        "randomized", "controlled", "versus", "vs", "compared",
-        "treatment", "therapy", "drug", "medication", "chemotherapy",
-        "immunotherapy", "targeted therapy", "radiation", "surgery",
-        "combination", "monotherapy", "dose", "efficacy", "safety",
-        "clinical trial", "therapeutic"
-    ]
-
-    # 观察性研究关键词（需要排除）
-    observational_keywords = [
-        "observational", "registry", "surveillance", "epidemiologic",
-        "natural history", "retrospective", "prospective cohort",
-        "case-control", "cross-sectional", "survey", "questionnaire",
-        "biomarker study", "correlative", "companion study"
-    ]
-
-    # 如果明确是观察性，排除
-    if any(keyword in title for keyword in observational_keywords):
-        return False
-
-    # 如果有干预性关键词，包含
-    if any(keyword in title for keyword in intervention_keywords):
-        return True
-
-    # 方法4: 检查主要结局指标
-    outcomes_info = protocol_section.get("outcomesModule", {})
-    primary_outcomes = outcomes_info.get("primaryOutcomes", [])
-
-    for outcome in primary_outcomes:
-        measure = outcome.get("measure", "").lower()
-
-        # 治疗效果相关的主要终点
-        therapeutic_endpoints = [
-            "response rate", "progression free survival", "overall survival",
-            "complete response", "partial response", "disease control",
-            "time to progression", "duration of response", "safety",
-            "maximum tolerated dose", "dose limiting toxicity", "efficacy"
-        ]
-
-        if any(endpoint in measure for endpoint in therapeutic_endpoints):
-            return True
-
-    # 方法5: 检查试验阶段
-    phases = design_info.get("phases", [])
-
-    # 有明确阶段的通常是干预性试验
-    therapeutic_phases = ["PHASE1", "PHASE2", "PHASE3", "PHASE4"]
-    if any(phase in phases for phase in therapeutic_phases):
-        return True
-
-    # 默认情况：如果无法明确判断，保守地包含
-    return True
+    advanced = ["(AREA[StudyType](INTERVENTIONAL OR EXPANDED_ACCESS) OR AREA[StudyType]MISSING)"]
+
+    user_gender = normalize_gender(user_input.gender or "")
+    if user_gender == "ALL":
+        advanced.append("(AREA[Sex]ALL OR AREA[Sex]MISSING)")
+    else:
+        advanced.append(f"(AREA[Sex](ALL OR {user_gender}) OR AREA[Sex]MISSING)")
+
+    if user_input.age_group in AGE_GROUP_RANGES:
+        user_min, user_max = AGE_GROUP_RANGES[user_input.age_group]
+        advanced.append(f"(AREA[MinimumAge]RANGE[MIN, {user_max} years] OR AREA[MinimumAge]MISSING)")
+        advanced.append(f"(AREA[MaximumAge]RANGE[{user_min} years, MAX] OR AREA[MaximumAge]MISSING)")
+
+    return {
+        "filter.overallStatus": ",".join(sorted(RELEVANT_STATUSES)),
+        "filter.advanced": " AND ".join(advanced)
+    }
 
 
 def build_search_strategies(user_input) -> List[dict]:
@@ -423,6 +372,11 @@ def build_search_strategies(user_input) -> List[dict]:
             "priority": "low"
         })
 
+    # 所有策略共用同一组服务端过滤条件
+    query_filters = build_query_filters(user_input)
+    for strategy in strategies:
+        strategy["filters"] = query_filters
+
     return strategies
 
 
@@ -3,6 +3,10 @@ Medical Dictionary for Clinical Trial Matching
 Contains comprehensive mappings of cancer types, gene mutations, and drug relationships
 """
 
+from typing import FrozenSet
+
+from keyword_matcher import KeywordMatcher
+
 # Cancer Type Synonyms and Related Terms
 CANCER_SYNONYMS = {
     # Lung Cancer
@@ -333,6 +337,35 @@ GENE_FOCUSED_KEYWORDS = [
     "molecular profiling", "genetic testing", "companion diagnostic"
 ]
 
+# Intervention types (armsInterventionsModule, lowercased) that deliver a treatment
+THERAPEUTIC_INTERVENTION_TYPES = [
+    "drug", "biological", "radiation", "procedure",
+    "device", "combination product", "genetic"
+]
+
+# Title keywords of observational studies
+OBSERVATIONAL_KEYWORDS = [
+    "observational", "registry", "surveillance", "epidemiologic",
+    "natural history", "retrospective", "prospective cohort",
+    "case-control", "cross-sectional", "survey", "questionnaire",
+    "biomarker study", "correlative", "companion study"
+]
+
+# Exclusion criteria wording that rules out patients with an active infection
+INFECTION_EXCLUSION_KEYWORDS = [
+    "active infection", "ongoing infection", "uncontrolled infection",
+    "systemic infection", "serious infection"
+]
+
+# Exclusion criteria wording the health safety score treats as an infection exclusion
+HEALTH_SAFETY_INFECTION_KEYWORDS = ["active infection", "ongoing infection", "uncontrolled infection"]
+
+# Broad-eligibility wording credited by the cancer type score
+BROAD_ELIGIBILITY_KEYWORDS = ["solid tumor", "advanced cancer", "metastatic cancer", "any cancer"]
+
+# Molecular profiling wording credited by the gene mutation score
+MOLECULAR_PROFILING_KEYWORDS = ["biomarker", "molecular profiling", "genetic testing", "mutation"]
+
 # Treatment stage mappings
 TREATMENT_STAGE_SYNONYMS = {
     "first-line": [
@@ -361,6 +394,26 @@ ECOG_DESCRIPTIONS = {
 }
 
 
+# One automaton over every keyword list used for gating and scoring
+DICTIONARY_KEYWORDS = KeywordMatcher(
+    EXCLUDED_CANCER_TYPES + PAN_CANCER_KEYWORDS + GENE_FOCUSED_KEYWORDS + OBSERVATIONAL_KEYWORDS
+    + INFECTION_EXCLUSION_KEYWORDS + HEALTH_SAFETY_INFECTION_KEYWORDS
+    + BROAD_ELIGIBILITY_KEYWORDS + MOLECULAR_PROFILING_KEYWORDS
+)
+
+
+# Function to find every dictionary keyword in a text field
+def keyword_hits(text: str) -> FrozenSet[str]:
+    """
+    Get the dictionary keywords occurring in a lowercased text field, in one pass
+
+    Check a keyword list against the result with `not hits.isdisjoint(KEYWORDS)`.
+    Only keywords of DICTIONARY_KEYWORDS can be found. Trial text is scanned
+    once per study version and kept in TrialFeatures (see trial_features.py).
+    """
+    return DICTIONARY_KEYWORDS.find(text)
+
+
 # Function to get all synonyms for a cancer type
 def get_cancer_synonyms(cancer_type: str) -> list:
     """Get all synonyms for a given cancer type"""
@@ -392,27 +445,3 @@ def is_excluded_cancer(cancer_type: str, user_cancers: list) -> bool:
         return True  # Exclude if no match with user's cancers
 
     return False
-
-
-# Function to check if trial is pan-cancer
-def is_pan_cancer_trial(title: str, inclusion: str) -> bool:
-    """Check if a trial is pan-cancer based on keywords"""
-    text = f"{title} {inclusion}".lower()
-    return any(keyword in text for keyword in PAN_CANCER_KEYWORDS)
-
-
-# Function to check if trial is gene-focused
-def is_gene_focused_trial(title: str, inclusion: str, gene: str = None) -> bool:
-    """Check if a trial is gene-focused"""
-    text = f"{title} {inclusion}".lower()
-
-    # General gene-focused keywords
-    if any(keyword in text for keyword in GENE_FOCUSED_KEYWORDS):
-        if gene:
-            gene_lower = gene.lower()
-            return gene_lower in text
-        return True
-
-    return False
-
-
@@ -0,0 +1,234 @@
+"""
+Pipelined pagination for ClinicalTrials.gov /studies searches
+The next page is requested as soon as its token is known, while the
+previous page is still being decoded and filtered
+"""
+
+import asyncio
+import logging
+import os
+import math
+import re
+from contextlib import suppress
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from api_client import get_with_retries
+from json_stream import StudyStreamParser
+
+logger = logging.getLogger(__name__)
+
+# Pages requested ahead of the one being parsed (0 = strictly serial)
+SEARCH_PREFETCH_DEPTH = int(os.getenv("SEARCH_PREFETCH_DEPTH", "1"))
+
+# Decode pages in slices so the prefetch request gets event-loop time in between
+PARSE_SLICE_BYTES = 64 * 1024
+
+# Partitioned pagination: most slices a broad query is split into (<= 1 disables),
+# and how many pages the query must span before splitting pays off
+SEARCH_PARTITIONS = int(os.getenv("SEARCH_PARTITIONS", "4"))
+SEARCH_PARTITION_MIN_PAGES = int(os.getenv("SEARCH_PARTITION_MIN_PAGES", "3"))
+# Start-date window the slice boundaries are spread over (years before / after today)
+PARTITION_YEARS_BACK = 6
+PARTITION_YEARS_AHEAD = 1
+
+_NEXT_PAGE_TOKEN_RE = re.compile(rb'"nextPageToken"\s*:\s*"([^"\\]*)"')
+_TOTAL_COUNT_RE = re.compile(rb'"totalCount"\s*:\s*(\d+)')
+_DONE = object()
+
+
+def scan_next_page_token(body: bytes) -> Optional[str]:
+    """
+    Find nextPageToken in a raw page without decoding it
+
+    The token is a top-level key that the API writes after the studies
+    array, so the scan starts from the end of the body. Quotes inside
+    study text are always escaped, so they cannot produce a false match.
+    """
+    start = body.rfind(b'"nextPageToken"')
+    if start < 0:
+        return None
+    match = _NEXT_PAGE_TOKEN_RE.match(body, start)
+    return match.group(1).decode("ascii") if match else None
+
+
+def scan_total_count(body: bytes) -> Optional[int]:
+    """Find totalCount (sent when countTotal=true) in a raw page without decoding it"""
+    start = body.rfind(b'"totalCount"')
+    if start < 0:
+        return None
+    match = _TOTAL_COUNT_RE.match(body, start)
+    return int(match.group(1)) if match else None
+
+
+def partition_count(total: Optional[int], page_size: int,
+                    max_partitions: int = SEARCH_PARTITIONS,
+                    min_pages: int = SEARCH_PARTITION_MIN_PAGES) -> int:
+    """Number of slices worth paging concurrently for a query matching `total` studies"""
+    if not total or max_partitions <= 1:
+        return 1
+    pages = math.ceil(total / page_size)
+    if pages < max(2, min_pages):
+        return 1
+    return min(max_partitions, pages)
+
+
+def start_date_partitions(count: int, today: Optional[date] = None) -> List[str]:
+    """
+    Split the StartDate axis into `count` disjoint Essie filters covering every study
+
+    Boundaries are spread evenly over the years where recruiting trials
+    cluster; the first slice is open-ended towards the past and also takes
+    studies without a start date, the last one is open-ended towards the future.
+    """
+    if count <= 1:
+        return []
+
+    today = today or date.today()
+    first_year = today.year - PARTITION_YEARS_BACK
+    span = PARTITION_YEARS_BACK + PARTITION_YEARS_AHEAD
+    boundaries = sorted({first_year + round(span * i / count) for i in range(1, count)})
+
+    bounds = ["MIN"] + [f"{year}-01-01" for year in boundaries]
+    ends = [f"{year - 1}-12-31" for year in boundaries] + ["MAX"]
+
+    partitions = []
+    for index, (low, high) in enumerate(zip(bounds, ends)):
+        expression = f"AREA[StartDate]RANGE[{low}, {high}]"
+        if index == 0:
+            expression = f"({expression} OR AREA[StartDate]MISSING)"
+        partitions.append(expression)
+    return partitions
+
+
+def partition_params(params: Dict, partition: str) -> Dict:
+    """Request parameters for one slice, AND-ed with any existing advanced filter"""
+    existing = params.get("filter.advanced")
+    return dict(params, **{"filter.advanced": f"({existing}) AND {partition}" if existing else partition})
+
+
+async def iter_body_studies(body: bytes, parser: StudyStreamParser) -> AsyncIterator[Dict]:
+    """
+    Yield studies from a raw page body one at a time, yielding to the event
+    loop between slices so in-flight prefetches keep making progress
+    """
+    for offset in range(0, len(body), PARSE_SLICE_BYTES):
+        for study in parser.feed(body[offset:offset + PARSE_SLICE_BYTES]):
+            yield study
+        await asyncio.sleep(0)
+
+    for study in parser.close():
+        yield study
+
+
+class PagePrefetcher:
+    """
+    Async iterator over the raw page bodies of one paginated search
+
+    A background task fetches pages through the shared rate limiter and
+    scans each body for nextPageToken, so it can request the following
+    page immediately. At most `depth` pages are fetched ahead of the
+    consumer, which bounds the raw bytes held in memory. Always close with
+    aclose() so an abandoned prefetch is cancelled.
+
+    With count_total the first page is requested with countTotal=true and
+    total_count is filled in from it (see first_page()), so sizing a search
+    costs no extra request.
+    """
+
+    def __init__(self, url: str, params: Dict, client: Optional[httpx.AsyncClient] = None,
+                 depth: int = SEARCH_PREFETCH_DEPTH, count_total: bool = False):
+        self.url = url
+        self.params = params
+        self.client = client
+        self.count_total = count_total
+        self.pages_fetched = 0
+        self.total_count: Optional[int] = None
+        self._first_page_done = asyncio.Event()
+        self._iterating = asyncio.Event()
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(0, depth) + 1)
+        self._task: Optional[asyncio.Task] = None
+        self._handed_out = False
+
+    def __aiter__(self) -> "PagePrefetcher":
+        return self
+
+    def start(self) -> "PagePrefetcher":
+        """Request the first page now, before iteration begins"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._produce())
+        return self
+
+    async def first_page(self) -> Optional[int]:
+        """
+        Start the search and wait until its first page has arrived (or failed)
+
+        Returns:
+            totalCount of the search when count_total is set and the page had it,
+            otherwise None; a failed page is raised later by iteration
+        """
+        self.start()
+        await self._first_page_done.wait()
+        return self.total_count
+
+    async def __anext__(self) -> bytes:
+        self.start()
+        self._iterating.set()
+
+        # Asking for the next page means the previous one has been consumed
+        if self._handed_out:
+            self._slots.release()
+
+        item = await self._queue.get()
+        if item is _DONE:
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+
+        self._handed_out = True
+        return item
+
+    async def _produce(self) -> None:
+        page_token = None
+        try:
+            while True:
+                await self._slots.acquire()
+
+                params = dict(self.params)
+                if page_token:
+                    params["pageToken"] = page_token
+                elif self.count_total:
+                    params["countTotal"] = "true"
+
+                response = await get_with_retries(self.url, params=params, client=self.client)
+                body = response.content
+                page_token = scan_next_page_token(body)
+                if self.pages_fetched == 0 and self.count_total:
+                    self.total_count = scan_total_count(body)
+                self.pages_fetched += 1
+
+                await self._queue.put(body)
+                self._first_page_done.set()
+                if not page_token:
+                    break
+                if self.count_total:
+                    # The caller may still drop this search for sliced ones; prefetch once it iterates
+                    await self._iterating.wait()
+
+            await self._queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._queue.put(e)
+        finally:
+            self._first_page_done.set()
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
@@ -0,0 +1,222 @@
+"""
+TTL + LRU result cache with an optional on-disk tier
+Used in front of search_trials_basic so repeated query.term searches
+are served without going back to ClinicalTrials.gov
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_MAXSIZE = int(os.getenv("QUERY_CACHE_MAXSIZE", "256"))
+# Total studies held across all cached searches; result sets range from a few
+# trials to thousands, so the entry count alone does not bound memory
+QUERY_CACHE_MAX_STUDIES = int(os.getenv("QUERY_CACHE_MAX_STUDIES", "20000"))
+QUERY_CACHE_DISK_PATH = os.getenv("QUERY_CACHE_DISK_PATH") or None
+# How long past its TTL an entry is kept as a fallback for upstream outages
+QUERY_CACHE_STALE_TTL = float(os.getenv("QUERY_CACHE_STALE_TTL", "86400"))
+
+
+class TTLCache:
+    """
+    In-memory LRU cache whose entries expire after a fixed TTL
+
+    With disk_path set, entries are also written to a SQLite file so they
+    survive restarts and are shared by workers on the same machine. The disk
+    tier is consulted on memory misses and promotes hits back into memory.
+
+    Expired entries are kept for another stale_ttl seconds; normal lookups
+    ignore them, but lookup(..., allow_stale=True) returns them so callers
+    can fall back to old results while upstream is unavailable.
+
+    With max_weight set, least recently used entries are also evicted while
+    the summed weigh(value) of the memory tier exceeds it; a value heavier
+    than max_weight on its own is not kept in memory.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_MAXSIZE, ttl: Optional[float] = QUERY_CACHE_TTL,
+                 disk_path: Optional[str] = None, name: str = "cache", stale_ttl: float = 0.0,
+                 max_weight: Optional[int] = None, weigh: Callable[[Any], int] = len):
+        self.maxsize = maxsize
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.disk_path = disk_path
+        self.name = name
+
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._weights: Dict[str, int] = {}
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+        if disk_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.disk_path)
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return self.ttl is None or time.monotonic() - stored_at < self.ttl
+
+    def _is_usable(self, stored_at: float, allow_stale: bool) -> bool:
+        if self._is_fresh(stored_at):
+            return True
+        return allow_stale and time.monotonic() - stored_at < self.ttl + self.stale_ttl
+
+    # ---------- memory tier ----------
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Memory-only lookup; returns None on a miss or an expired entry"""
+        entry = self._entries.get(key)
+        if entry is not None and self._is_usable(entry[0], allow_stale):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if not self._is_fresh(entry[0]):
+                self.stale_hits += 1
+            return entry[1]
+
+        if entry is not None and not self._is_usable(entry[0], allow_stale=True):
+            self._discard(key)
+        return None
+
+    def _discard(self, key: str) -> None:
+        del self._entries[key]
+        self.weight -= self._weights.pop(key, 0)
+
+    def get_or_set(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Memory-only lookup that counts a miss and stores factory() in its place"""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        """Memory-only insert, evicting least recently used entries past maxsize or max_weight"""
+        if key in self._entries:
+            self._discard(key)
+        if self.max_weight is not None:
+            weight = self.weigh(value)
+            if weight > self.max_weight:
+                return
+            self._weights[key] = weight
+            self.weight += weight
+        self._entries[key] = (time.monotonic() if stored_at is None else stored_at, value)
+
+        while self._entries and (len(self._entries) > self.maxsize or
+                                 (self.max_weight is not None and self.weight > self.max_weight)):
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    # ---------- memory + disk ----------
+
+    async def lookup(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Look up a key in memory, then on disk if a disk tier is configured"""
+        value = self.get(key, allow_stale)
+        if value is not None:
+            return value
+
+        if self.disk_path:
+            stored = await asyncio.to_thread(self._disk_get, key, allow_stale)
+            if stored is not None:
+                self.disk_hits += 1
+                self.hits += 1
+                if not self._is_fresh(stored[0]):
+                    self.stale_hits += 1
+                self.put(key, stored[1], stored_at=stored[0])
+                return stored[1]
+
+        self.misses += 1
+        return None
+
+    async def store(self, key: str, value: Any) -> None:
+        """Insert into memory and, if configured, persist to disk"""
+        self.put(key, value)
+        if self.disk_path:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def _disk_get(self, key: str, allow_stale: bool = False) -> Optional[Tuple[float, Any]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT stored_at, value FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name}: disk read failed: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+
+        # Disk timestamps are wall-clock; convert back to the monotonic clock used in memory
+        stored_at = time.monotonic() - (time.time() - row[0])
+        if not self._is_usable(stored_at, allow_stale):
+            return None
+        return stored_at, json.loads(row[1])
+
+    def _disk_put(self, key: str, value: Any) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, stored_at, value) VALUES (?, ?, ?)",
+                    (key, time.time(), json.dumps(value, separators=(",", ":")))
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name}: disk write failed: {str(e)}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._weights.clear()
+        self.weight = 0
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the metrics endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "disk_tier": bool(self.disk_path),
+        }
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Stable cache key from query parameters"""
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+
+
+# Shared cache for search_trials_basic results, weighed by studies per result
+search_cache = TTLCache(
+    maxsize=QUERY_CACHE_MAXSIZE,
+    max_weight=QUERY_CACHE_MAX_STUDIES,
+    ttl=QUERY_CACHE_TTL,
+    disk_path=QUERY_CACHE_DISK_PATH,
+    name="search_cache",
+    stale_ttl=QUERY_CACHE_STALE_TTL,
+)
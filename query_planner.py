@@ -0,0 +1,155 @@
+"""
+Search query planner
+Folds the per-patient search strategies into a few combined OR queries and
+drops queries whose results are already covered by a broader one
+"""
+
+import logging
+import os
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_PLANNER_ENABLED = os.getenv("QUERY_PLANNER_ENABLED", "1").lower() not in ("0", "false", "no")
+# Upper bound on sub-queries OR-ed into one request (keeps URLs and Essie parse cost reasonable)
+QUERY_PLANNER_MAX_TERMS = int(os.getenv("QUERY_PLANNER_MAX_TERMS", "8"))
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+_OPERATOR_RE = re.compile(r'\b(?:AND|OR|NOT)\b|[()"\[\]]')
+_TOKEN_RE = re.compile(r"[\w+\-]+")
+
+
+def query_terms(query: str) -> Optional[FrozenSet[str]]:
+    """
+    Lower-cased terms of a plain query, or None if it uses Essie operators
+
+    Plain ClinicalTrials.gov queries AND their terms together, so a query
+    whose terms are a subset of another's matches at least as many studies.
+    """
+    if _OPERATOR_RE.search(query):
+        return None
+    terms = frozenset(token.lower() for token in _TOKEN_RE.findall(query))
+    return terms or None
+
+
+def _filters_key(strategy: Dict) -> Tuple:
+    return tuple(sorted((strategy.get("filters") or {}).items()))
+
+
+def _priority_rank(strategy: Dict) -> int:
+    return PRIORITY_ORDER.get(strategy.get("priority"), len(PRIORITY_ORDER))
+
+
+def _is_mergeable(strategy: Dict) -> bool:
+    # A capped strategy depends on ranking within its own result list
+    return strategy.get("max_results") is None
+
+
+def remove_subsumed(strategies: List[Dict]) -> List[Dict]:
+    """
+    Drop strategies whose results are contained in a broader strategy's
+
+    A strategy is subsumed when another uncapped strategy with the same
+    filters has a subset of its terms (an exact duplicate keeps the first
+    occurrence). The broader strategy inherits the best priority of the
+    strategies it absorbs, so its results are ranked where theirs were.
+    """
+    terms = [query_terms(strategy["query"]) for strategy in strategies]
+    kept = [dict(strategy, merged_from=[strategy["query"]]) for strategy in strategies]
+    absorbed_by: Dict[int, int] = {}
+
+    for i, strategy in enumerate(strategies):
+        if terms[i] is None or not _is_mergeable(strategy):
+            continue
+        for j, broader in enumerate(strategies):
+            if i == j or j in absorbed_by or terms[j] is None or not _is_mergeable(broader):
+                continue
+            if _filters_key(strategy) != _filters_key(broader):
+                continue
+            if terms[j] < terms[i] or (terms[j] == terms[i] and j < i):
+                absorbed_by[i] = j
+                break
+
+    def root(index: int) -> int:
+        while index in absorbed_by:
+            index = absorbed_by[index]
+        return index
+
+    for i in absorbed_by:
+        target = kept[root(i)]
+        target["merged_from"].extend(kept[i]["merged_from"])
+        if _priority_rank(strategies[i]) < _priority_rank(target):
+            target["priority"] = strategies[i]["priority"]
+
+    return [strategy for i, strategy in enumerate(kept) if i not in absorbed_by]
+
+
+def merge_strategies(strategies: List[Dict], max_terms: int = QUERY_PLANNER_MAX_TERMS) -> List[Dict]:
+    """
+    OR together uncapped strategies that share a priority and filters
+
+    Groups are emitted in priority order; within a group the original
+    strategy order is preserved.
+    """
+    groups: Dict[Tuple, List[Dict]] = {}
+    standalone: List[Dict] = []
+
+    for strategy in strategies:
+        if _is_mergeable(strategy):
+            key = (_priority_rank(strategy), _filters_key(strategy))
+            groups.setdefault(key, []).append(strategy)
+        else:
+            standalone.append(strategy)
+
+    planned = []
+    for key in sorted(groups, key=lambda group_key: group_key[0]):
+        members = groups[key]
+        for start in range(0, len(members), max(1, max_terms)):
+            chunk = members[start:start + max(1, max_terms)]
+            if len(chunk) == 1:
+                planned.append(chunk[0])
+                continue
+
+            planned.append({
+                **chunk[0],
+                "query": " OR ".join(f"({member['query']})" for member in chunk),
+                "merged_from": [query for member in chunk for query in member["merged_from"]],
+            })
+
+    return planned + standalone
+
+
+def plan_search_strategies(strategies: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """
+    Plan the searches for one patient
+
+    Args:
+        strategies: Output of build_search_strategies
+
+    Returns:
+        (planned strategies, plan stats). Every planned strategy lists the
+        original queries it covers in "merged_from". Since each query costs
+        at least one page request, the saving estimate is the drop in query
+        count; overlapping result pages are saved on top of that.
+    """
+    if not QUERY_PLANNER_ENABLED or len(strategies) < 2:
+        planned = [dict(strategy, merged_from=[strategy["query"]]) for strategy in strategies]
+        after_subsumption = len(planned)
+    else:
+        deduplicated = remove_subsumed(strategies)
+        after_subsumption = len(deduplicated)
+        planned = merge_strategies(deduplicated)
+
+    stats = {
+        "strategies": len(strategies),
+        "after_subsumption": after_subsumption,
+        "planned_queries": len(planned),
+        "estimated_requests_saved": len(strategies) - len(planned),
+    }
+    logger.info(f"Query plan: {stats['strategies']} strategies -> {stats['planned_queries']} queries "
+                f"({stats['strategies'] - after_subsumption} subsumed, "
+                f"~{stats['estimated_requests_saved']} requests saved)")
+
+    return planned, stats
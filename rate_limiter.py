@@ -0,0 +1,129 @@
+"""
+Process-wide adaptive token-bucket rate limiter for ClinicalTrials.gov
+Every outbound request takes a token; 429s shrink the rate and pause the
+bucket, successful requests grow it back towards the configured ceiling
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_INITIAL = float(os.getenv("CTGOV_RATE_LIMIT", "5"))          # requests per second
+RATE_LIMIT_MIN = float(os.getenv("CTGOV_RATE_LIMIT_MIN", "0.5"))
+RATE_LIMIT_MAX = float(os.getenv("CTGOV_RATE_LIMIT_MAX", "10"))
+RATE_LIMIT_BURST = float(os.getenv("CTGOV_RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_INCREASE = float(os.getenv("CTGOV_RATE_LIMIT_INCREASE", "0.05"))  # added per success
+RATE_LIMIT_DECREASE = float(os.getenv("CTGOV_RATE_LIMIT_DECREASE", "0.5"))   # multiplied on 429
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("CTGOV_RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BACKOFF_BASE = float(os.getenv("CTGOV_RETRY_BACKOFF_BASE", "0.5"))
+RETRY_BACKOFF_MAX = float(os.getenv("CTGOV_RETRY_BACKOFF_MAX", "20"))
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to upstream throttling (AIMD)
+
+    - acquire() waits for a token, FIFO across all callers
+    - on_success() adds a small increment to the rate, up to max_rate
+    - on_throttle() multiplies the rate down and pauses the bucket for Retry-After
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_INITIAL, min_rate: float = RATE_LIMIT_MIN,
+                 max_rate: float = RATE_LIMIT_MAX, burst: float = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.requests = 0
+        self.throttle_events = 0
+        self.retries = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests += 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Back off after a 429: shrink the rate and honor Retry-After for everyone"""
+        self.throttle_events += 1
+        self.rate = max(self.min_rate, self.rate * RATE_LIMIT_DECREASE)
+        self._tokens = 0
+        self._last_refill = time.monotonic()
+
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+        logger.warning(f"Upstream throttled, rate lowered to {self.rate:.2f} req/s"
+                       f"{f', pausing {retry_after:.1f}s' if retry_after else ''}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "current_rate": round(self.rate, 3),
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "tokens_available": round(min(self.burst, self._tokens), 2),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "requests": self.requests,
+            "throttle_events": self.throttle_events,
+            "retries": self.retries,
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+
+# Shared by every outbound ClinicalTrials.gov request in the process
+rate_limiter = AdaptiveRateLimiter()
@@ -0,0 +1,110 @@
+"""
+Per-request deadline for the matching pipeline
+Each stage checks the remaining time; whatever does not finish in time is
+dropped and recorded, and the response is marked partial
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a match / report request may spend on upstream work (0 disables)
+MATCH_REQUEST_DEADLINE = float(os.getenv("MATCH_REQUEST_DEADLINE", "20"))
+# Part of the deadline held back from searching so detail enrichment still gets a chance
+MATCH_DETAIL_RESERVE = float(os.getenv("MATCH_DETAIL_RESERVE", "3"))
+
+
+class RequestContext:
+    """
+    Deadline and degradation record for one request
+
+    Stages call remaining() to bound their waits. Queries that were cut off
+    go into skipped_queries and stages cut short into degraded_steps.
+    Either one makes the response partial. Queries answered from expired
+    cache entries during an upstream outage go into stale_queries.
+    """
+
+    def __init__(self, timeout: Optional[float] = MATCH_REQUEST_DEADLINE):
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.skipped_queries: List[str] = []
+        self.degraded_steps: List[str] = []
+        self.stale_queries: List[str] = []
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, None when there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def search_deadline(self) -> Optional[float]:
+        """Deadline for the search stage (time.monotonic() timestamp)"""
+        if self.deadline is None:
+            return None
+        return max(self.started, self.deadline - MATCH_DETAIL_RESERVE)
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.skipped_queries or self.degraded_steps)
+
+    @property
+    def stale(self) -> bool:
+        return bool(self.stale_queries)
+
+    def activate(self) -> "RequestContext":
+        """Make this the context seen by code that is not handed it explicitly"""
+        current_request.set(self)
+        return self
+
+    def skip_queries(self, queries: List[str]) -> None:
+        self.skipped_queries.extend(query for query in queries if query not in self.skipped_queries)
+
+    def degrade(self, step: str) -> None:
+        if step not in self.degraded_steps:
+            self.degraded_steps.append(step)
+            logger.warning(f"Request deadline reached during {step}, continuing with partial results")
+
+    async def run(self, awaitable: Awaitable[Any], step: str, default: Any = None) -> Any:
+        """
+        Await a stage within the remaining time
+
+        Returns default (and records the step as degraded) if the deadline
+        passes first. The stage is cancelled, so it should keep whatever it
+        finished before that somewhere the caller can still read.
+        """
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.remaining())
+        except asyncio.TimeoutError:
+            self.degrade(step)
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "partial": self.partial,
+            "skipped_queries": self.skipped_queries,
+            "degraded_steps": self.degraded_steps,
+            "stale": self.stale,
+            "stale_queries": self.stale_queries,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+        }
+
+
+# Context of the request being served by the current task (copied into tasks it spawns)
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+
+def note_stale_query(query: str) -> None:
+    """Record on the current request, if any, that a query was answered from stale cache"""
+    context = current_request.get()
+    if context is not None and query not in context.stale_queries:
+        context.stale_queries.append(query)
@@ -1,28 +1,32 @@
 from models import QuestionnaireInput
-from medical_dictionary import get_cancer_synonyms
+from medical_dictionary import (
+    BROAD_ELIGIBILITY_KEYWORDS, MOLECULAR_PROFILING_KEYWORDS, HEALTH_SAFETY_INFECTION_KEYWORDS, get_cancer_synonyms
+)
+from ecog_matching import EcogRequirements, ecog_level
+from trial_features import TrialFeatures, get_trial_features
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
-def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
+def score_trial(trial: dict, user_input: QuestionnaireInput, features: Optional[TrialFeatures] = None) -> dict:
     """
     Revised scoring system based on survey weight analysis
     Total: 100 points distributed according to medical importance
+
+    features: the trial's parsed features, shared with the eligibility gates
+    (parsed here when not given)
     """
     explanations = []
     risk_flags = []
 
     # Extract trial information
-    protocol_section = trial.get("protocolSection", {})
-    identification = protocol_section.get("identificationModule", {})
-    eligibility = protocol_section.get("eligibilityModule", {})
+    features = features or get_trial_features(trial)
+    identification = trial.get("protocolSection", {}).get("identificationModule", {})
 
-    title = identification.get("officialTitle", "").lower()
     nct_id = identification.get("nctId", "")
     url = f"https://clinicaltrials.gov/ct2/show/{nct_id}"
 
-    inclusion_criteria = eligibility.get("inclusionCriteria", "").lower()
-    exclusion_criteria = eligibility.get("exclusionCriteria", "").lower()
+    inclusion_criteria = features.inclusion
 
     # Initialize score
     match_score = 0
@@ -31,7 +35,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 1. CANCER TYPE MATCHING - 30% (30 points) - PRIMARY FILTER
     # ======================
     cancer_score, cancer_explanation = score_cancer_type_match(
-        user_input.cancer_types, title, inclusion_criteria
+        user_input.cancer_types, features
     )
     match_score += cancer_score
     explanations.append(cancer_explanation)
@@ -40,7 +44,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 2. GENE MUTATION MATCHING - 20% (20 points) - PRECISION MEDICINE
     # ======================
     gene_score, gene_explanation = score_gene_mutation_match(
-        user_input.gene_mutation, title, inclusion_criteria
+        user_input.gene_mutation, features
     )
     match_score += gene_score
     explanations.append(gene_explanation)
@@ -58,7 +62,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 4. ECOG PERFORMANCE STATUS - 10% (10 points) - ELIGIBILITY CRITICAL
     # ======================
     ecog_score, ecog_explanation = score_ecog_match(
-        user_input.ecog_score, inclusion_criteria, exclusion_criteria
+        user_input.ecog_score, features.ecog
     )
     match_score += ecog_score
     explanations.append(ecog_explanation)
@@ -76,7 +80,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 6. AGE ELIGIBILITY - 5% (5 points) - HARD REQUIREMENT
     # ======================
     age_score, age_explanation = score_age_eligibility(
-        user_input.age_group, eligibility
+        user_input.age_group, features.min_age, features.max_age
     )
     match_score += age_score
     if age_score == 0:
@@ -87,7 +91,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 7. GENDER ELIGIBILITY - 5% (5 points) - HARD REQUIREMENT
     # ======================
     gender_score, gender_explanation = score_gender_eligibility(
-        user_input.gender, eligibility
+        user_input.gender, features.sex
     )
     match_score += gender_score
     if gender_score == 0:
@@ -98,7 +102,7 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     # 8. HEALTH CONDITIONS - 5% (5 points) - SAFETY EXCLUSIONS
     # ======================
     health_score, health_explanation = score_health_safety(
-        user_input.health_conditions, user_input.active_infection, exclusion_criteria
+        user_input.health_conditions, user_input.active_infection, features
     )
     match_score += health_score
     if health_score < 3:
@@ -142,11 +146,12 @@ def score_trial(trial: dict, user_input: QuestionnaireInput) -> dict:
     }
 
 
-def score_cancer_type_match(cancer_types: List[str], title: str, inclusion: str) -> Tuple[float, str]:
+def score_cancer_type_match(cancer_types: List[str], features: TrialFeatures) -> Tuple[float, str]:
     """
     Score cancer type matching - 30 points maximum
     This is the primary filter - if cancer doesn't match, low score
     """
+    title, inclusion = features.title, features.inclusion
     if not cancer_types:
         return 5, "⚠️ Cancer type information needed for accurate matching"
 
@@ -167,20 +172,19 @@ def score_cancer_type_match(cancer_types: List[str], title: str, inclusion: str)
             return 15, f"✅ Cancer Type Match: Trial includes {synonym} which matches your {primary_cancer}"
 
     # Pan-cancer or solid tumor trials (10 points)
-    pan_cancer_keywords = ["solid tumor", "advanced cancer", "metastatic cancer", "any cancer"]
-    for keyword in pan_cancer_keywords:
-        if keyword in title or keyword in inclusion:
-            return 10, f"✅ Broad Eligibility: Pan-cancer trial accepts multiple cancer types"
+    if features.mentions_any(BROAD_ELIGIBILITY_KEYWORDS):
+        return 10, f"✅ Broad Eligibility: Pan-cancer trial accepts multiple cancer types"
 
     # No clear match (5 points - minimum)
     return 5, "⚠️ Cancer type match unclear - requires detailed eligibility review"
 
 
-def score_gene_mutation_match(gene_mutation: str, title: str, inclusion: str) -> Tuple[float, str]:
+def score_gene_mutation_match(gene_mutation: str, features: TrialFeatures) -> Tuple[float, str]:
     """
     Score gene mutation matching - 20 points maximum
     Critical for precision medicine trials
     """
+    title, inclusion = features.title, features.inclusion
     if not gene_mutation:
         return 5, "⚠️ No genetic testing information - may miss targeted therapy opportunities"
 
@@ -207,8 +211,7 @@ def score_gene_mutation_match(gene_mutation: str, title: str, inclusion: str) ->
             return 15, f"✅ Targeted Therapy Match: Trial focuses on {gene} alterations"
 
     # Broad molecular profiling (8 points)
-    molecular_keywords = ["biomarker", "molecular profiling", "genetic testing", "mutation"]
-    if any(keyword in inclusion for keyword in molecular_keywords):
+    if not features.inclusion_hits.isdisjoint(MOLECULAR_PROFILING_KEYWORDS):
         return 8, f"✅ Molecular Medicine: Trial includes genetic profiling (your {gene} status relevant)"
 
     # No genetic focus (3 points)
@@ -246,7 +249,7 @@ def score_metastasis_match(metastasis_status: str, inclusion: str) -> Tuple[floa
     return 5, "✅ Disease stage considered in matching"
 
 
-def score_ecog_match(ecog_score: str, inclusion: str, exclusion: str) -> Tuple[float, str]:
+def score_ecog_match(ecog_score: str, requirements: EcogRequirements) -> Tuple[float, str]:
     """
     Score ECOG performance status - 10 points maximum
     Critical eligibility factor
@@ -255,25 +258,12 @@ def score_ecog_match(ecog_score: str, inclusion: str, exclusion: str) -> Tuple[f
         return 5, "⚠️ Performance status assessment needed for accurate trial matching"
 
     try:
-        ecog_num = int(ecog_score.replace("+", "")) if ecog_score.replace("+", "").isdigit() else 4
-    except:
+        ecog_num = ecog_level(ecog_score)
+    except ValueError:
         ecog_num = 4
 
-    # Check for ECOG requirements in inclusion criteria
-    ecog_patterns = [
-        r"ecog.{0,15}[≤<=]\s*([0-3])",
-        r"performance.{0,25}status.{0,15}[≤<=]\s*([0-3])",
-    ]
-
-    trial_max_ecog = None
-    for pattern in ecog_patterns:
-        match = re.search(pattern, inclusion, re.IGNORECASE)
-        if match:
-            try:
-                trial_max_ecog = int(match.group(1))
-                break
-            except:
-                continue
+    # ECOG requirements in the inclusion criteria (shared with the eligibility gate)
+    trial_max_ecog = requirements.trial_max_ecog
 
     # Scoring based on ECOG compatibility
     if ecog_num <= 1:
@@ -366,15 +356,13 @@ def score_treatment_stage_match(treatment_stage: str, recent_surgery: bool, incl
     return min(score, 10), final_explanation
 
 
-def score_age_eligibility(age_group: str, eligibility: dict) -> Tuple[float, str]:
+def score_age_eligibility(age_group: str, min_age: Optional[float], max_age: Optional[float]) -> Tuple[float, str]:
     """
     Age eligibility - 5 points (PASS/FAIL with partial credit)
     This is a hard requirement, not a bonus
+    Trial limits are in years, None when the trial states none
     """
-    min_age = eligibility.get("minimumAge", "")
-    max_age = eligibility.get("maximumAge", "")
-
-    if not min_age and not max_age:
+    if min_age is None and max_age is None:
         return 5, "✅ Age Eligibility: No age restrictions in trial"
 
     # Parse user age range
@@ -388,8 +376,8 @@ def score_age_eligibility(age_group: str, eligibility: dict) -> Tuple[float, str
     user_min, user_max = age_ranges.get(age_group, (18, 100))
 
     # Parse trial age requirements
-    trial_min = parse_age(min_age) if min_age else 0
-    trial_max = parse_age(max_age) if max_age else 150
+    trial_min = min_age if min_age is not None else 0
+    trial_max = max_age if max_age is not None else 150
 
     # Check age compatibility
     if user_min >= trial_min and user_max <= trial_max:
@@ -397,16 +385,15 @@ def score_age_eligibility(age_group: str, eligibility: dict) -> Tuple[float, str
     elif user_max >= trial_min and user_min <= trial_max:  # Partial overlap
         return 3, f"⚠️ Age Borderline: {age_group} partially overlaps with trial requirements"
     else:
-        return 0, f"❌ Age Ineligible: {age_group} does not meet trial age requirements ({trial_min}-{trial_max})"
+        return 0, f"❌ Age Ineligible: {age_group} does not meet trial age requirements ({trial_min:g}-{trial_max:g})"
 
 
-def score_gender_eligibility(gender: str, eligibility: dict) -> Tuple[float, str]:
+def score_gender_eligibility(gender: str, trial_gender: str) -> Tuple[float, str]:
     """
     Gender eligibility - 5 points (PASS/FAIL)
     This is a hard requirement, not a bonus
+    trial_gender: the trial's sex restriction (MALE / FEMALE / ALL)
     """
-    trial_gender = eligibility.get("sex", "ALL").upper()
-
     if trial_gender == "ALL":
         return 5, "✅ Gender Eligible: Trial open to all genders"
 
@@ -419,17 +406,18 @@ def score_gender_eligibility(gender: str, eligibility: dict) -> Tuple[float, str
         return 0, f"❌ Gender Ineligible: Trial restricted to {trial_gender.lower()}, you are {gender}"
 
 
-def score_health_safety(health_conditions: List[str], active_infection: bool, exclusion: str) -> Tuple[float, str]:
+def score_health_safety(health_conditions: List[str], active_infection: bool,
+                        features: TrialFeatures) -> Tuple[float, str]:
     """
     Health and safety scoring - 5 points maximum
     """
+    exclusion = features.exclusion
     score = 5  # Start with full points, deduct for risks
     concerns = []
 
     # Active infection check
     if active_infection:
-        infection_exclusions = ["active infection", "ongoing infection", "uncontrolled infection"]
-        if any(ex in exclusion.lower() for ex in infection_exclusions):
+        if not features.exclusion_hits.isdisjoint(HEALTH_SAFETY_INFECTION_KEYWORDS):
             score -= 3
             concerns.append("Active infection may require resolution")
         else:
@@ -485,14 +473,6 @@ def score_participation_readiness(upload_reports: bool, consent_data_collection:
         return 1, "✅ Basic Participation: Standard trial participation level"
 
 
-def parse_age(age_str: str) -> int:
-    """Parse age string to extract numeric value"""
-    if not age_str:
-        return 0
-    numbers = re.findall(r'\d+', age_str)
-    return int(numbers[0]) if numbers else 0
-
-
 def categorize_trials_by_score(trials: list, thresholds: dict = None) -> dict:
     """
     Categorize trials by revised score ranges
@@ -0,0 +1,169 @@
+"""
+Priority-aware scheduling of trial searches
+High-priority strategies always run; lower tiers are skipped or cancelled
+once the eligible pool is large enough or the time budget is spent
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from query_planner import PRIORITY_ORDER
+
+logger = logging.getLogger(__name__)
+
+# Stop optional tiers once this many eligible trials are in the pool (0 disables)
+SEARCH_POOL_TARGET = int(os.getenv("SEARCH_POOL_TARGET", "200"))
+# Seconds after which optional tiers are skipped or cancelled (0 disables)
+SEARCH_TIME_BUDGET = float(os.getenv("SEARCH_TIME_BUDGET", "8"))
+# Tiers that always run to completion; the first tier always does as well
+SEARCH_REQUIRED_PRIORITIES = frozenset(
+    priority.strip() for priority in os.getenv("SEARCH_REQUIRED_PRIORITIES", "high,medium").split(",")
+    if priority.strip()
+)
+
+SearchFn = Callable[[str, Optional[int], Optional[Dict[str, str]]], Awaitable[List[Dict]]]
+
+
+class SearchScheduler:
+    """
+    Run search strategies tier by tier in priority order
+
+    Strategies in one tier run concurrently and results are yielded as each
+    completes. The consumer reports the eligible pool size and how many new
+    unique trials every strategy contributed; optional tiers are skipped
+    (not started) or cancelled (in flight) as soon as the pool target or the
+    time budget is reached. An optional request deadline (a time.monotonic()
+    timestamp) cuts off every tier, required ones included; strategies it
+    drops end up with status "deadline".
+    """
+
+    def __init__(self, strategies: List[Dict], search_fn: SearchFn,
+                 pool_target: int = SEARCH_POOL_TARGET, time_budget: float = SEARCH_TIME_BUDGET,
+                 required_priorities: frozenset = SEARCH_REQUIRED_PRIORITIES,
+                 deadline: Optional[float] = None):
+        self.strategies = strategies
+        self.search_fn = search_fn
+        self.pool_target = pool_target
+        self.time_budget = time_budget
+        self.required_priorities = required_priorities
+        self.deadline = deadline
+
+        self.pool_size = 0
+        self.strategy_stats: List[Dict[str, Any]] = [
+            {
+                "query": strategy["query"],
+                "priority": strategy.get("priority"),
+                "status": "pending",
+                "results": 0,
+                "new_unique": 0,
+                "seconds": None,
+            }
+            for strategy in strategies
+        ]
+        self._started: Optional[float] = None
+
+    def _tiers(self) -> List[Tuple[Optional[str], List[int]]]:
+        tiers: Dict[int, List[int]] = {}
+        for index, strategy in enumerate(self.strategies):
+            rank = PRIORITY_ORDER.get(strategy.get("priority"), len(PRIORITY_ORDER))
+            tiers.setdefault(rank, []).append(index)
+        return [(self.strategies[indexes[0]].get("priority"), indexes)
+                for _, indexes in sorted(tiers.items())]
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self._started if self._started is not None else 0.0
+
+    def _remaining_time(self, optional: bool) -> Optional[float]:
+        limits = []
+        if optional and self.time_budget:
+            limits.append(self.time_budget - self._elapsed())
+        if self.deadline is not None:
+            limits.append(self.deadline - time.monotonic())
+        return max(0.0, min(limits)) if limits else None
+
+    def deadline_passed(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def budget_exhausted(self) -> bool:
+        """True once the pool target or the time budget has been reached"""
+        if self.pool_target and self.pool_size >= self.pool_target:
+            return True
+        return bool(self.time_budget) and self._elapsed() >= self.time_budget
+
+    def record(self, index: int, new_unique: int, pool_size: int) -> None:
+        """Report what a finished strategy added to the pool"""
+        self.strategy_stats[index]["new_unique"] = new_unique
+        self.pool_size = pool_size
+
+    async def _run(self, index: int) -> Tuple[int, List[Dict]]:
+        strategy = self.strategies[index]
+        stats = self.strategy_stats[index]
+        stats["status"] = "running"
+        started = time.monotonic()
+
+        try:
+            trials = await self.search_fn(strategy["query"], strategy.get("max_results"), strategy.get("filters"))
+            stats["status"] = "completed"
+        except asyncio.CancelledError:
+            stats["status"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.warning(f"Search strategy failed: {strategy['query']} ({str(e)})")
+            stats["status"] = "failed"
+            trials = []
+        finally:
+            stats["seconds"] = round(time.monotonic() - started, 3)
+
+        stats["results"] = len(trials)
+        return index, trials
+
+    async def results(self) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """
+        Yield (strategy index, trials) as strategies complete, tier by tier
+        """
+        self._started = time.monotonic()
+
+        for tier_number, (priority, indexes) in enumerate(self._tiers()):
+            optional = tier_number > 0 and priority not in self.required_priorities
+
+            if self.deadline_passed() or (optional and self.budget_exhausted()):
+                status = "deadline" if self.deadline_passed() else "skipped"
+                for index in indexes:
+                    self.strategy_stats[index]["status"] = status
+                continue
+
+            tasks = {asyncio.ensure_future(self._run(index)): index for index in indexes}
+            pending = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, timeout=self._remaining_time(optional),
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+
+                    if pending and (self.deadline_passed() or (optional and self.budget_exhausted())):
+                        break
+            finally:
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    if self.deadline_passed():
+                        for task in pending:
+                            self.strategy_stats[tasks[task]]["status"] = "deadline"
+
+    def summary(self) -> Dict[str, Any]:
+        statuses = [stats["status"] for stats in self.strategy_stats]
+        return {
+            "elapsed_seconds": round(self._elapsed(), 3),
+            "pool_size": self.pool_size,
+            "completed": statuses.count("completed"),
+            "skipped": statuses.count("skipped"),
+            "cancelled": statuses.count("cancelled"),
+            "failed": statuses.count("failed"),
+            "deadline": statuses.count("deadline"),
+            "strategies": self.strategy_stats,
+        }
@@ -0,0 +1,86 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one in-flight upstream fetch
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key
+
+    The first caller for a key starts the fetch as a task; callers arriving
+    while it is running await the same task instead of issuing their own
+    request. The key is released as soon as the task finishes, so results
+    are never reused after the fact (that is the cache's job). When every
+    caller waiting on a key has been cancelled, the fetch is cancelled too.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fetch() for key, or join the call already in flight for it
+
+        Args:
+            key: Identity of the upstream request
+            fetch: Zero-argument coroutine factory performing the request
+
+        Returns:
+            The shared result (exceptions are raised to every waiting caller)
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._release(key, finished))
+        else:
+            self.followers += 1
+            logger.debug(f"{self.name}: joining in-flight request {key}")
+
+        # Shield so one caller being cancelled does not cancel the fetch for the others
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not task.done():
+                    self.abandoned += 1
+                    logger.debug(f"{self.name}: no callers left, cancelling {key}")
+                    # Forget it now so a later caller starts a fresh fetch
+                    self._release(key, task)
+                    task.cancel()
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if task.done() and not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "abandoned": self.abandoned,
+        }
+
+
+# Shared coalescing groups for paginated searches and single-study fetches
+search_flight = SingleFlight("search_flight")
+study_flight = SingleFlight("study_flight")
@@ -0,0 +1,92 @@
+"""
+The vectorized numeric gates plus the per-trial text gates must accept exactly
+the trials passes_hard_eligibility_gates accepts
+"""
+
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from columnar_gates import TrialColumns  # noqa: E402
+from match_logic import numeric_gate_mask, passes_hard_eligibility_gates, passes_text_gates  # noqa: E402
+from models import QuestionnaireInput  # noqa: E402
+from trial_features import TrialFeatures  # noqa: E402
+
+CRITERIA_FRAGMENTS = [
+    "ecog 0-1", "ecog <= 1", "ecog ≤ 2", "ecog ≤ 3", "ecog 2 or less", "ecog ≥ 2", "ecog >= 3",
+    "performance status ≤ 1", "lung cancer", "breast cancer", "solid tumor", "egfr mutation",
+    "active infection", "severe cardiac disease", "registry", "randomized", "observational",
+    "adequate organ function", "measurable disease", "prior systemic therapy",
+]
+
+
+def make_trials(count: int, seed: int = 7):
+    rng = random.Random(seed)
+
+    def text(words: int) -> str:
+        return " ".join(rng.choice(CRITERIA_FRAGMENTS) for _ in range(words))
+
+    trials = []
+    for i in range(count):
+        trials.append({"protocolSection": {
+            "identificationModule": {"nctId": f"NCT{i:08d}", "officialTitle": text(rng.randint(1, 5))},
+            "eligibilityModule": {
+                "inclusionCriteria": text(rng.randint(0, 8)),
+                "exclusionCriteria": text(rng.randint(0, 8)),
+                "sex": rng.choice(["ALL", "MALE", "FEMALE", ""]),
+                "minimumAge": rng.choice(["", "18 Years", "6 Months", "50 Years", "70 Years", "N/A"]),
+                "maximumAge": rng.choice(["", "17 Years", "45 Years", "65 Years", "99 Years"]),
+            },
+            "designModule": {"studyType": rng.choice(["", "INTERVENTIONAL", "OBSERVATIONAL"])},
+            "armsInterventionsModule": {"interventions": [{"type": rng.choice(["DRUG", "BEHAVIORAL"])}]},
+        }})
+    return trials
+
+
+def make_patients():
+    base = {
+        "diagnosed": True, "gene_mutation": "EGFR",
+        "metastasis_status": "寡转移", "recent_surgery": False, "treatment_stage": "一线治疗中",
+        "recent_drugs": [], "upload_reports": False, "consent_data_collection": True,
+        "patient_name": "Test", "date_of_birth": "01/01/1970",
+        "current_location": "Boston, MA", "preferred_country": "United States",
+    }
+    patients = []
+    for gender, age_group, ecog, infection, cancer in itertools.product(
+            ["男", "女", "其他"], ["未满18", "18-39", "40-64", "65+"], ["", "0", "1", "2", "≥3", "不清楚"],
+            [False, True], [["lung cancer"], ["breast cancer"]]):
+        patients.append(QuestionnaireInput(**base, gender=gender, age_group=age_group, ecog_score=ecog,
+                                           active_infection=infection, health_conditions=["cardiac"],
+                                           cancer_types=cancer))
+    return patients
+
+
+def test_columnar_path_matches_per_trial_gates():
+    trials = make_trials(3000)
+    features = [TrialFeatures.from_trial(trial) for trial in trials]
+
+    for patient in make_patients():
+        mask = numeric_gate_mask(features, patient)
+        assert mask is not None
+        for trial, trial_features, numeric_passed in zip(trials, features, mask):
+            columnar = numeric_passed and passes_text_gates(trial_features, patient)
+            assert columnar == passes_hard_eligibility_gates(trial, patient, trial_features), trial
+
+
+def test_small_batches_use_the_per_trial_path():
+    features = [TrialFeatures.from_trial(trial) for trial in make_trials(3)]
+    assert numeric_gate_mask(features, make_patients()[0]) is None
+
+
+def test_columns_match_feature_rows():
+    features = [TrialFeatures.from_trial(trial) for trial in make_trials(50)]
+    columns = TrialColumns(features)
+    assert len(columns) == 50
+    for i, item in enumerate(features):
+        min_age, max_age, sex, ecog_admits, interventional = item.gate_row
+        assert columns.min_age[i] == min_age and columns.max_age[i] == max_age
+        assert columns.sex[i] == sex and columns.ecog_admits[i] == ecog_admits
+        assert columns.interventional[i] == interventional
@@ -0,0 +1,80 @@
+"""
+StudyStreamParser must yield the same studies and fields as json.loads, wherever
+the chunk boundaries fall
+"""
+
+import json
+import random
+
+import pytest
+
+from json_stream import StudyStreamParser
+
+TRICKY_STUDIES = [
+    {"protocolSection": {"identificationModule": {"nctId": "NCT00000001",
+                                                  "officialTitle": "Brackets ] } [ { inside \"quotes\""}}},
+    {"protocolSection": {"eligibilityModule": {"inclusionCriteria": "ECOG ≤ 1\nback\\slash \\\" and \\\\"}}},
+    {"protocolSection": {"identificationModule": {"officialTitle": "肺癌 EGFR 突变 — 🧬 trial"},
+                         "designModule": {"phases": ["PHASE1", "PHASE2"], "enrollment": 12345.5}}},
+    {"protocolSection": {"statusModule": {"overallStatus": "RECRUITING", "flag": True, "note": None}}},
+    [],
+    {},
+]
+
+
+def page(studies, **fields):
+    return json.dumps({"studies": studies, **fields}, ensure_ascii=False).encode("utf-8")
+
+
+def parse_in_chunks(body: bytes, sizes):
+    parser = StudyStreamParser()
+    items = []
+    pos = 0
+    for size in sizes:
+        items.extend(parser.feed(body[pos:pos + size]))
+        pos += size
+    items.extend(parser.feed(body[pos:]))
+    items.extend(parser.close())
+    return items, parser.fields
+
+
+def test_every_split_point_of_a_tricky_page():
+    body = page(TRICKY_STUDIES, nextPageToken="abc\"def", totalCount=1234)
+    for split in range(len(body) + 1):
+        items, fields = parse_in_chunks(body, [split])
+        assert items == TRICKY_STUDIES, split
+        assert fields == {"nextPageToken": "abc\"def", "totalCount": 1234}, split
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_fixed_chunk_sizes(size):
+    body = page(TRICKY_STUDIES * 3, totalCount=18)
+    items, fields = parse_in_chunks(body, [size] * (len(body) // size + 1))
+    assert items == TRICKY_STUDIES * 3
+    assert fields == {"totalCount": 18}
+
+
+def test_random_chunks_of_large_studies():
+    rng = random.Random(5)
+    studies = [{"protocolSection": {"eligibilityModule": {
+        "inclusionCriteria": "".join(rng.choice("ab{}[]\"\\ ≤肺🧬\n") for _ in range(5000))
+    }}} for _ in range(20)]
+    body = page(studies)
+    sizes = [rng.randint(1, 700) for _ in range(len(body) // 100)]
+    items, _ = parse_in_chunks(body, sizes)
+    assert items == studies
+
+
+def test_top_level_array_export():
+    body = json.dumps(TRICKY_STUDIES, ensure_ascii=False).encode("utf-8")
+    items, fields = parse_in_chunks(body, [11] * (len(body) // 11 + 1))
+    assert items == TRICKY_STUDIES
+    assert fields == {}
+
+
+def test_truncated_document_raises():
+    body = page(TRICKY_STUDIES)
+    parser = StudyStreamParser()
+    list(parser.feed(body[:-10]))
+    with pytest.raises(ValueError):
+        list(parser.close())
@@ -0,0 +1,57 @@
+"""
+The mirror's full-text rows must follow their studies rows through updates,
+removals, sweeps and the migration from the NCT-ID-keyed layout
+"""
+
+import sqlite3
+
+from trial_store import TrialStore
+
+
+def study(index: int, word: str = "lung", status: str = "RECRUITING"):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{index:08d}", "officialTitle": f"{word} cancer trial"},
+        "statusModule": {"overallStatus": status, "lastUpdatePostDateStruct": {"date": "2025-01-01"}},
+    }}
+
+
+def found(store: TrialStore, word: str):
+    return sorted(item["protocolSection"]["identificationModule"]["nctId"] for item in store.search(word))
+
+
+def fts_rows(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM studies_fts").fetchone()[0]
+
+
+def test_updates_removals_and_sweep_keep_the_index_in_step(tmp_path):
+    path = str(tmp_path / "mirror.db")
+    store = TrialStore(path)
+    store.upsert_studies([study(i) for i in range(10)])
+
+    assert store.upsert_studies([study(1, "breast"), study(2, status="COMPLETED")]) == {"stored": 1, "removed": 1}
+    assert found(store, "breast") == ["NCT00000001"]
+    assert "NCT00000001" not in found(store, "lung") and "NCT00000002" not in found(store, "lung")
+
+    assert store.remove_except({f"NCT{i:08d}" for i in range(5)}) == 5
+    assert found(store, "lung") == ["NCT00000000", "NCT00000003", "NCT00000004"]
+    assert store.count() == fts_rows(path) == 4
+
+
+def test_migrates_the_nct_id_keyed_layout(tmp_path):
+    path = str(tmp_path / "mirror.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE studies (nct_id TEXT PRIMARY KEY, overall_status TEXT NOT NULL,
+                                  last_update_post_date TEXT, study_json TEXT NOT NULL);
+            CREATE VIRTUAL TABLE studies_fts USING fts5(nct_id UNINDEXED, search_text);
+        """)
+        conn.execute("INSERT INTO studies VALUES ('NCT00000007', 'RECRUITING', '2025-01-01', "
+                     "'{\"protocolSection\": {\"identificationModule\": "
+                     "{\"nctId\": \"NCT00000007\", \"officialTitle\": \"lung cancer trial\"}}}')")
+    conn.close()
+
+    store = TrialStore(path)
+    assert found(store, "lung") == ["NCT00000007"]
+    store.upsert_studies([study(7, "breast")])
+    assert found(store, "breast") == ["NCT00000007"] and found(store, "lung") == []
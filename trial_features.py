@@ -0,0 +1,152 @@
+"""
+Patient-independent features of a trial, derived once per study
+Everything the hard eligibility gates and the scoring engine read from a
+study (normalized criteria text, age limits, sex, design, ECOG limits and
+dictionary keyword hits) is parsed here a single time right after the study
+is fetched, instead of being re-derived by every gate and scorer
+
+Features are cached across requests by (NCT ID, lastUpdatePostDate), so a
+study only gets parsed again once ClinicalTrials.gov publishes an update
+"""
+
+import os
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from ecog_matching import EcogRequirements, extract_ecog_requirements
+from medical_dictionary import (
+    OBSERVATIONAL_KEYWORDS, THERAPEUTIC_INTERVENTION_TYPES,
+    PAN_CANCER_KEYWORDS, GENE_FOCUSED_KEYWORDS, keyword_hits
+)
+from query_cache import TTLCache
+from utils import parse_age_years, study_version_key
+
+# Cross-request feature cache (0 disables it). An entry holds the lowercased
+# title and criteria text plus small derived fields, often 10-30 KB, so the
+# default bounds it at roughly 20-60 MB.
+FEATURE_CACHE_MAXSIZE = int(os.getenv("FEATURE_CACHE_MAXSIZE", "2000"))
+
+# Trial sex restriction codes for the columnar gates (see columnar_gates.py)
+SEX_CODES = {"ALL": 0, "MALE": 1, "FEMALE": 2}
+SEX_UNKNOWN = -1
+
+# Open-ended age limits, as in the per-trial age gate
+NO_MIN_AGE = 0.0
+NO_MAX_AGE = 150.0
+
+# No TTL: the key carries the study version, so entries never go stale
+feature_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=FEATURE_CACHE_MAXSIZE, ttl=None, name="feature_cache")
+    if FEATURE_CACHE_MAXSIZE > 0 else None
+)
+
+
+class TrialFeatures:
+    """
+    Parsed view of one ClinicalTrials.gov study
+
+    Text fields are lowercased; min_age / max_age are in years (None when the
+    trial states no usable limit); sex and study_type are upper-case API
+    enums; *_hits are the dictionary keywords found in each text field (see
+    medical_dictionary.keyword_hits). gate_row holds the numeric gate inputs
+    (min age, max age, sex code, admitted-ECOG bitmask, interventional) as
+    one row of the columnar gate arrays.
+    """
+
+    __slots__ = (
+        "nct_id", "last_update", "title", "inclusion", "exclusion",
+        "min_age", "max_age", "sex", "study_type", "phases", "intervention_types", "ecog",
+        "title_hits", "inclusion_hits", "exclusion_hits",
+        "interventional", "pan_cancer", "gene_focused", "gate_row",
+    )
+
+    def __init__(self, nct_id: str, last_update: str, title: str, inclusion: str, exclusion: str,
+                 min_age: Optional[float], max_age: Optional[float],
+                 sex: str, study_type: str, phases: Tuple[str, ...], intervention_types: FrozenSet[str]):
+        self.nct_id = nct_id
+        self.last_update = last_update
+        self.title = title
+        self.inclusion = inclusion
+        self.exclusion = exclusion
+        self.min_age = min_age
+        self.max_age = max_age
+        self.sex = sex
+        self.study_type = study_type
+        self.phases = phases
+        self.intervention_types = intervention_types
+
+        self.ecog: EcogRequirements = extract_ecog_requirements(inclusion, exclusion)
+        self.title_hits = keyword_hits(title)
+        self.inclusion_hits = keyword_hits(inclusion)
+        self.exclusion_hits = keyword_hits(exclusion)
+
+        self.pan_cancer = self.mentions_any(PAN_CANCER_KEYWORDS)
+        self.gene_focused = self.mentions_any(GENE_FOCUSED_KEYWORDS)
+        self.interventional = self._classify_interventional()
+        self.gate_row = (
+            NO_MIN_AGE if min_age is None else min_age,
+            NO_MAX_AGE if max_age is None else max_age,
+            SEX_CODES.get(sex, SEX_UNKNOWN),
+            self.ecog.admitted_levels(),
+            self.interventional,
+        )
+
+    @classmethod
+    def from_trial(cls, trial: Dict) -> "TrialFeatures":
+        """Parse an API-shaped study ({"protocolSection": ...})"""
+        protocol_section = trial.get("protocolSection", {})
+        identification = protocol_section.get("identificationModule", {})
+        status = protocol_section.get("statusModule", {})
+        eligibility = protocol_section.get("eligibilityModule", {})
+        design = protocol_section.get("designModule", {})
+        interventions = protocol_section.get("armsInterventionsModule", {}).get("interventions", [])
+
+        return cls(
+            nct_id=identification.get("nctId", ""),
+            last_update=status.get("lastUpdatePostDateStruct", {}).get("date", ""),
+            title=identification.get("officialTitle", "").lower(),
+            inclusion=eligibility.get("inclusionCriteria", "").lower(),
+            exclusion=eligibility.get("exclusionCriteria", "").lower(),
+            min_age=parse_age_years(eligibility.get("minimumAge", "")),
+            max_age=parse_age_years(eligibility.get("maximumAge", "")),
+            sex=eligibility.get("sex", "ALL").upper(),
+            study_type=design.get("studyType", "").upper(),
+            phases=tuple(design.get("phases", [])),
+            intervention_types=frozenset(
+                intervention.get("type", "").lower() for intervention in interventions
+            ),
+        )
+
+    def mentions_any(self, keywords) -> bool:
+        """True when the title or the inclusion criteria contain one of the dictionary keywords"""
+        return not self.title_hits.isdisjoint(keywords) or not self.inclusion_hits.isdisjoint(keywords)
+
+    def _classify_interventional(self) -> bool:
+        """
+        Whether the study tests an actual treatment intervention
+
+        Decided by study type, then therapeutic intervention types, then
+        observational title keywords. Everything else is kept: intervention
+        title keywords, treatment endpoints and a phase all point to a
+        treatment study, and undecidable studies are included conservatively.
+        """
+        if self.study_type == "OBSERVATIONAL":
+            return False
+        if self.study_type == "INTERVENTIONAL":
+            return True
+        if not self.intervention_types.isdisjoint(THERAPEUTIC_INTERVENTION_TYPES):
+            return True
+        return self.title_hits.isdisjoint(OBSERVATIONAL_KEYWORDS)
+
+
+def get_trial_features(trial: Dict) -> TrialFeatures:
+    """
+    Features of a study, from the cross-request cache when this version was seen before
+
+    Studies without an NCT ID or lastUpdatePostDate are parsed every time,
+    since a changed record could not be told apart from the cached one.
+    """
+    key = study_version_key(trial) if feature_cache is not None else None
+    if key is None:
+        return TrialFeatures.from_trial(trial)
+
+    return feature_cache.get_or_set(key, lambda: TrialFeatures.from_trial(trial))
@@ -0,0 +1,136 @@
+"""
+Index of studies already downloaded, keyed by NCT ID
+Lets the detail enrichment step reuse search payloads and only go to the
+network for fields the search projection did not include
+"""
+
+import logging
+import os
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence, Tuple
+
+from query_cache import TTLCache
+from utils import extract_nct_id, study_version_key
+
+logger = logging.getLogger(__name__)
+
+# Optional cross-request tier (0 disables it), keyed by study version
+# (utils.study_version_key) so a study updated upstream is never completed
+# with fields of an older record
+STUDY_CACHE_MAXSIZE = int(os.getenv("STUDY_CACHE_MAXSIZE", "2000"))
+STUDY_CACHE_TTL = float(os.getenv("STUDY_CACHE_TTL", "3600"))
+
+# Loaded field set of an entry; None means the whole record
+LoadedFields = Optional[FrozenSet[str]]
+
+study_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=STUDY_CACHE_MAXSIZE, ttl=STUDY_CACHE_TTL, name="study_cache")
+    if STUDY_CACHE_MAXSIZE > 0 else None
+)
+
+
+def fields_cover(loaded: LoadedFields, field: str) -> bool:
+    """Check whether a loaded projection includes a field path (directly or via a parent)"""
+    if loaded is None:
+        return True
+    return any(field == path or field.startswith(path + ".") for path in loaded)
+
+
+def merge_study(base: Dict, update: Dict) -> Dict:
+    """
+    Merge two partial study records without mutating either
+
+    Search payloads are shared through the search cache, so the merged
+    record copies every dict on the way down instead of updating in place.
+    """
+    merged = dict(base)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_study(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class TrialIndex:
+    """
+    Per-request map of NCT ID -> (loaded field set, study record)
+
+    Entries are seeded from the search results of the current request and
+    backed by the optional cross-request study_cache, which only completes
+    entries whose version (NCT ID and lastUpdatePostDate) it holds.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[LoadedFields, Dict]] = {}
+
+    @classmethod
+    def from_trials(cls, trials: Iterable[Dict], fields: Optional[Sequence[str]]) -> "TrialIndex":
+        """
+        Index search results
+
+        Args:
+            trials: Raw studies returned by the trial search
+            fields: Projection they were fetched with (the search_fields of the
+                    TrialSource that ran the search); None for full records
+        """
+        loaded = frozenset(fields) if fields else None
+
+        index = cls()
+        for trial in trials:
+            nct_id = extract_nct_id(trial)
+            if nct_id:
+                index._entries[nct_id] = (loaded, trial)
+        return index
+
+    def _entry(self, nct_id: str) -> Optional[Tuple[LoadedFields, Dict]]:
+        return self._entries.get(nct_id)
+
+    def get(self, nct_id: str) -> Optional[Dict]:
+        entry = self._entry(nct_id)
+        return entry[1] if entry else None
+
+    def missing_fields(self, nct_id: str, fields: Sequence[str]) -> Tuple[str, ...]:
+        """Fields from `fields` that have not been downloaded for this study yet"""
+        entry = self._entry(nct_id)
+        if entry is None:
+            return tuple(fields)
+        missing = tuple(field for field in fields if not fields_cover(entry[0], field))
+
+        # A previous request may already have completed this version of the study
+        key = study_version_key(entry[1]) if missing and study_cache is not None else None
+        if key is not None:
+            cached = study_cache.get(key)
+            if cached is not None and cached is not entry:
+                cached_missing = tuple(field for field in fields if not fields_cover(cached[0], field))
+                if len(cached_missing) < len(missing):
+                    self._entries[nct_id] = cached
+                    return cached_missing
+        return missing
+
+    def merge(self, nct_id: str, study: Dict, fields: Optional[Sequence[str]]) -> Dict:
+        """
+        Add freshly fetched fields for a study and remember them across requests
+
+        Args:
+            nct_id: Clinical trial NCT ID
+            study: Partial (or full) study record that was fetched
+            fields: Projection it was fetched with, None for the full record
+        """
+        entry = self._entry(nct_id)
+        if entry is None:
+            loaded, merged = (frozenset(fields) if fields else None), study
+        else:
+            loaded = None if entry[0] is None or not fields else entry[0] | frozenset(fields)
+            merged = merge_study(entry[1], study)
+
+        self._entries[nct_id] = (loaded, merged)
+        key = study_version_key(merged) if study_cache is not None else None
+        if key is not None:
+            study_cache.put(key, (loaded, merged))
+        return merged
+
+    def __contains__(self, nct_id: str) -> bool:
+        return self._entry(nct_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,246 @@
+"""
+Pluggable trial data sources
+The matching pipeline searches and enriches through a TrialSource, so the
+same code runs against the live API, the local SQLite mirror or recorded
+fixtures (offline benchmarks, deterministic load tests, batch jobs)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+from clinicaltrials_api import SEARCH_FIELDS, DETAIL_FIELDS, search_trials_basic, fetch_studies_by_ids
+from query_cache import make_cache_key
+from trial_index import merge_study
+from trial_store import TrialStore, get_trial_store
+from utils import extract_nct_id
+
+logger = logging.getLogger(__name__)
+
+# "api" (live ClinicalTrials.gov), "local" (SQLite mirror) or "fixture" (recorded responses)
+TRIAL_DATA_SOURCE = os.getenv("TRIAL_DATA_SOURCE", "api").lower()
+TRIAL_FIXTURE_DIR = os.getenv("TRIAL_FIXTURE_DIR", "fixtures")
+# Record everything the configured source returns into this fixture directory
+TRIAL_RECORD_DIR = os.getenv("TRIAL_RECORD_DIR") or None
+
+# Fixture file describing the recorded source's projections
+FIXTURE_SOURCE_FILE = "source.json"
+
+
+class TrialSource(ABC):
+    """
+    Search-by-term and get-by-IDs over some store of ClinicalTrials.gov studies
+
+    Studies are always API-shaped ({"protocolSection": ...}). search_fields is
+    the projection search results carry (None when they are full records), and
+    full_records tells whether get_by_ids ignores the requested fields and
+    returns whole records.
+    """
+
+    name = "source"
+    search_fields: Optional[Sequence[str]] = None
+    full_records = True
+
+    @abstractmethod
+    async def search(self, condition: str, max_results: Optional[int] = None,
+                     filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Recruiting studies matching a query.term-style condition"""
+
+    @abstractmethod
+    async def get_by_ids(self, nct_ids: List[str],
+                         fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+        """Map of NCT ID -> study for the IDs that could be found"""
+
+
+class LiveApiSource(TrialSource):
+    """ClinicalTrials.gov v2 over the shared httpx client (cached, rate limited, retried)"""
+
+    name = "api"
+    search_fields = SEARCH_FIELDS
+    full_records = False
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.client = client
+
+    async def search(self, condition: str, max_results: Optional[int] = None,
+                     filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        return await search_trials_basic(condition, max_results, filters, client=self.client)
+
+    async def get_by_ids(self, nct_ids: List[str],
+                         fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+        return await fetch_studies_by_ids(nct_ids, self.client, fields=fields)
+
+
+class LocalStoreSource(TrialSource):
+    """
+    The local SQLite mirror (see trial_store.py and bulk_ingest.py)
+
+    Server-side filters are not evaluated here: the mirror only holds
+    recruiting studies and the hard eligibility gates run afterwards anyway.
+    """
+
+    name = "local"
+
+    def __init__(self, store: Optional[TrialStore] = None):
+        self.store = store or get_trial_store()
+
+    async def search(self, condition: str, max_results: Optional[int] = None,
+                     filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        trials = await asyncio.to_thread(self.store.search, condition, max_results)
+        logger.info(f"Local search complete: {condition} -> {len(trials)} recruiting trials")
+        return trials
+
+    async def get_by_ids(self, nct_ids: List[str],
+                         fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+        studies = await asyncio.to_thread(self.store.get_by_ids, nct_ids)
+        return {extract_nct_id(study): study for study in studies}
+
+
+def fixture_search_key(condition: str, max_results: Optional[int], filters: Optional[Dict[str, str]]) -> str:
+    """File name (without extension) of a recorded search"""
+    key = make_cache_key(condition, max_results, filters)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class FixtureSource(TrialSource):
+    """
+    Recorded responses replayed from a directory
+
+    Layout (written by RecordingSource):
+        source.json
+            {"name": ..., "search_fields": [...] or null, "full_records": ...}
+            of the recorded source, restored here so replayed searches are
+            enriched with the same detail requests as the recorded run
+        searches/<sha1 of condition, max_results, filters>.json
+            {"condition": ..., "max_results": ..., "filters": ..., "studies": [...]}
+        studies/<NCT ID>.json
+            every field get_by_ids returned for the study, merged across calls
+
+    A search that was never recorded returns no studies (and logs a warning),
+    so replays are deterministic. upstream_standin.py serves the same
+    directory over HTTP when the live API code path should be exercised too.
+    """
+
+    name = "fixture"
+
+    def __init__(self, directory: str = TRIAL_FIXTURE_DIR):
+        self.directory = directory
+        recorded = self._read(FIXTURE_SOURCE_FILE)
+        if recorded is not None:
+            fields = recorded.get("search_fields")
+            self.search_fields = tuple(fields) if fields is not None else None
+            self.full_records = recorded.get("full_records", True)
+
+    def _read(self, *parts: str) -> Optional[Dict]:
+        path = os.path.join(self.directory, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as fixture:
+            return json.load(fixture)
+
+    async def search(self, condition: str, max_results: Optional[int] = None,
+                     filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        name = f"{fixture_search_key(condition, max_results, filters)}.json"
+        recorded = await asyncio.to_thread(self._read, "searches", name)
+        if recorded is None:
+            logger.warning(f"No recorded fixture for search '{condition}' in {self.directory}")
+            return []
+        return recorded["studies"]
+
+    async def get_by_ids(self, nct_ids: List[str],
+                         fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+        studies = {}
+        for nct_id in dict.fromkeys(nct_ids):
+            study = await asyncio.to_thread(self._read, "studies", f"{nct_id}.json")
+            if study is not None:
+                studies[nct_id] = study
+        return studies
+
+
+class RecordingSource(TrialSource):
+    """
+    Pass-through to another source that writes every answer as a fixture
+
+    This is the only recorder; both FixtureSource and upstream_standin.py
+    replay its directory.
+    """
+
+    def __init__(self, inner: TrialSource, directory: str):
+        self.inner = inner
+        self.directory = directory
+        self.name = f"{inner.name}+recording"
+        self.search_fields = inner.search_fields
+        self.full_records = inner.full_records
+
+        fields = list(inner.search_fields) if inner.search_fields is not None else None
+        self._write({"name": inner.name, "search_fields": fields, "full_records": inner.full_records},
+                    FIXTURE_SOURCE_FILE)
+
+    def _write(self, payload: Dict, *parts: str) -> None:
+        path = os.path.join(self.directory, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fixture:
+            json.dump(payload, fixture, ensure_ascii=False)
+
+    def _write_study(self, nct_id: str, study: Dict) -> None:
+        """Record a fetched study, merged with the fields recorded for it before"""
+        path = os.path.join(self.directory, "studies", f"{nct_id}.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fixture:
+                study = merge_study(json.load(fixture), study)
+        self._write(study, "studies", f"{nct_id}.json")
+
+    async def search(self, condition: str, max_results: Optional[int] = None,
+                     filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        studies = await self.inner.search(condition, max_results, filters)
+        recorded = {"condition": condition, "max_results": max_results, "filters": filters, "studies": studies}
+        name = f"{fixture_search_key(condition, max_results, filters)}.json"
+        await asyncio.to_thread(self._write, recorded, "searches", name)
+        return studies
+
+    async def get_by_ids(self, nct_ids: List[str],
+                         fields: Optional[Sequence[str]] = DETAIL_FIELDS) -> Dict[str, Dict]:
+        studies = await self.inner.get_by_ids(nct_ids, fields)
+        for nct_id, study in studies.items():
+            await asyncio.to_thread(self._write_study, nct_id, study)
+        return studies
+
+
+def create_trial_source(kind: str = TRIAL_DATA_SOURCE, record_dir: Optional[str] = TRIAL_RECORD_DIR) -> TrialSource:
+    """Build the source named by configuration, optionally wrapped in a recorder"""
+    if kind == "api":
+        source: TrialSource = LiveApiSource()
+    elif kind == "local":
+        source = LocalStoreSource()
+    elif kind == "fixture":
+        source = FixtureSource()
+    else:
+        raise ValueError(f"Unknown TRIAL_DATA_SOURCE '{kind}' (expected api, local or fixture)")
+
+    if record_dir:
+        source = RecordingSource(source, record_dir)
+    logger.info(f"Trial data source: {source.name}")
+    return source
+
+
+_source: Optional[TrialSource] = None
+
+
+def get_trial_source() -> TrialSource:
+    """Shared source for the configured TRIAL_DATA_SOURCE"""
+    global _source
+    if _source is None:
+        _source = create_trial_source()
+    return _source
+
+
+def set_trial_source(source: Optional[TrialSource]) -> None:
+    """Swap the shared source (batch jobs, benchmarks); None restores the configured one"""
+    global _source
+    _source = source
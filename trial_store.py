@@ -0,0 +1,419 @@
+"""
+Local SQLite mirror of recruiting ClinicalTrials.gov studies
+Populated by an incremental sync job (or bulk_ingest.py) and searched with
+SQLite FTS5, so matching can run without touching the live API
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import httpx
+
+from api_client import CTGOV_API_BASE, get_http_client, close_http_client, get_with_retries
+from clinicaltrials_api import RELEVANT_STATUSES
+from utils import extract_nct_id
+
+logger = logging.getLogger(__name__)
+
+TRIAL_STORE_PATH = os.getenv("TRIAL_STORE_PATH", "trial_store.db")
+
+SYNC_PAGE_SIZE = 1000
+
+# studies_fts rows share the rowid of their studies row (id), so index
+# updates and deletes are rowid lookups rather than scans of the FTS table
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    id INTEGER PRIMARY KEY,
+    nct_id TEXT NOT NULL UNIQUE,
+    overall_status TEXT NOT NULL,
+    last_update_post_date TEXT,
+    study_json TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS studies_fts USING fts5(search_text);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_QUERY_TOKEN_RE = re.compile(r"\(|\)|[^\s()]+")
+_AREA_RE = re.compile(r"AREA\[[^\]]*\]\s*(\([^)]*\)|.*?(?=\s+(?:AND|OR|NOT)\s|\)|$))")
+_FTS_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class TrialStore:
+    """
+    SQLite-backed store of recruiting / not-yet-recruiting studies
+
+    Each row keeps the study's protocolSection as JSON, shaped like an API
+    study ({"protocolSection": ...}) so the matching code reads it unchanged.
+    """
+
+    def __init__(self, path: str = TRIAL_STORE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            migrate = _needs_migration(conn)
+            if migrate:
+                conn.execute("ALTER TABLE studies RENAME TO studies_v1")
+                conn.execute("DROP TABLE studies_fts")
+            conn.executescript(_SCHEMA)
+            if migrate:
+                self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Copy a mirror whose FTS rows were keyed by NCT ID into the rowid-keyed layout"""
+        logger.info(f"Migrating {self.path} to rowid-keyed full-text rows")
+        conn.execute(
+            "INSERT INTO studies (nct_id, overall_status, last_update_post_date, study_json) "
+            "SELECT nct_id, overall_status, last_update_post_date, study_json FROM studies_v1"
+        )
+        conn.execute("DROP TABLE studies_v1")
+        for row_id, study_json in conn.execute("SELECT id, study_json FROM studies").fetchall():
+            protocol_section = json.loads(study_json).get("protocolSection", {})
+            conn.execute("INSERT INTO studies_fts (rowid, search_text) VALUES (?, ?)",
+                         (row_id, build_search_text(protocol_section)))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection for one transaction: committed (or rolled back) and closed on exit"""
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- writes ----------
+
+    def upsert_studies(self, studies: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Insert or refresh studies, removing ones that are no longer recruiting
+
+        Returns:
+            Counts of stored and removed studies
+        """
+        stored = 0
+        removed = 0
+
+        with self._connect() as conn:
+            for study in studies:
+                nct_id = extract_nct_id(study)
+                if not nct_id:
+                    continue
+
+                protocol_section = study.get("protocolSection", {})
+                status_module = protocol_section.get("statusModule", {})
+                status = status_module.get("overallStatus", "")
+
+                row = conn.execute("SELECT id FROM studies WHERE nct_id = ?", (nct_id,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM studies_fts WHERE rowid = ?", row)
+
+                if status not in RELEVANT_STATUSES:
+                    if row:
+                        removed += conn.execute("DELETE FROM studies WHERE id = ?", row).rowcount
+                    continue
+
+                # Updated in place so the row keeps its id (and with it its FTS rowid)
+                cursor = conn.execute(
+                    "INSERT INTO studies (nct_id, overall_status, last_update_post_date, study_json) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (nct_id) DO UPDATE SET overall_status = excluded.overall_status, "
+                    "last_update_post_date = excluded.last_update_post_date, study_json = excluded.study_json",
+                    (
+                        nct_id,
+                        status,
+                        get_last_update_date(study),
+                        json.dumps({"protocolSection": protocol_section}, separators=(",", ":")),
+                    )
+                )
+                conn.execute(
+                    "INSERT INTO studies_fts (rowid, search_text) VALUES (?, ?)",
+                    (row[0] if row else cursor.lastrowid, build_search_text(protocol_section))
+                )
+                stored += 1
+
+        return {"stored": stored, "removed": removed}
+
+    def remove_studies(self, nct_ids: Iterable[str]) -> int:
+        """
+        Delete the given studies where the mirror holds them (IDs it lacks are skipped)
+
+        Returns:
+            Number of studies removed
+        """
+        with self._connect() as conn:
+            stale = [row for nct_id in nct_ids
+                     for row in conn.execute("SELECT id FROM studies WHERE nct_id = ?", (nct_id,))]
+            conn.executemany("DELETE FROM studies_fts WHERE rowid = ?", stale)
+            conn.executemany("DELETE FROM studies WHERE id = ?", stale)
+        return len(stale)
+
+    def remove_except(self, keep_nct_ids: Set[str]) -> int:
+        """
+        Delete every study not in keep_nct_ids (the sweep of a full sync)
+
+        Returns:
+            Number of studies removed
+        """
+        with self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE keep_ids (nct_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO keep_ids (nct_id) VALUES (?)",
+                             ((nct_id,) for nct_id in keep_nct_ids))
+            # One pass over studies; the FTS rows are then deleted by rowid
+            stale = conn.execute(
+                "SELECT id FROM studies WHERE NOT EXISTS (SELECT 1 FROM keep_ids k WHERE k.nct_id = studies.nct_id)"
+            ).fetchall()
+            conn.executemany("DELETE FROM studies_fts WHERE rowid = ?", stale)
+            conn.executemany("DELETE FROM studies WHERE id = ?", stale)
+            conn.execute("DROP TABLE keep_ids")
+        return len(stale)
+
+    def get_sync_marker(self) -> Optional[str]:
+        """Latest lastUpdatePostDate pulled by a previous sync"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'last_update_post_date'").fetchone()
+        return row[0] if row else None
+
+    def set_sync_marker(self, date: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_update_post_date', ?)",
+                (date,)
+            )
+
+    # ---------- reads ----------
+
+    def search(self, condition: str, max_results: Optional[int] = None) -> List[Dict]:
+        """
+        Full-text search over the mirror using a query.term-style expression
+
+        Args:
+            condition: Search condition, same syntax the live search receives
+            max_results: Maximum results to return, None for unlimited
+
+        Returns:
+            List of recruiting studies
+        """
+        fts_query = to_fts_query(condition)
+        if not fts_query:
+            return []
+
+        sql = (
+            "SELECT s.study_json FROM studies_fts f JOIN studies s ON s.id = f.rowid "
+            "WHERE studies_fts MATCH ? ORDER BY f.rank"
+        )
+        params: list = [fts_query]
+        if max_results:
+            sql += " LIMIT ?"
+            params.append(max_results)
+
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.error(f"Local search failed for '{condition}' ({fts_query}): {str(e)}")
+            return []
+
+        return [json.loads(row[0]) for row in rows]
+
+    def get_by_ids(self, nct_ids: List[str]) -> List[Dict]:
+        """Look up stored studies by NCT ID, preserving the requested order"""
+        if not nct_ids:
+            return []
+
+        placeholders = ",".join("?" for _ in nct_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT nct_id, study_json FROM studies WHERE nct_id IN ({placeholders})",
+                list(nct_ids)
+            ).fetchall()
+
+        found = {nct_id: json.loads(study_json) for nct_id, study_json in rows}
+        return [found[nct_id] for nct_id in nct_ids if nct_id in found]
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM studies").fetchone()[0]
+
+
+def _needs_migration(conn: sqlite3.Connection) -> bool:
+    """Whether the database holds the earlier layout (FTS rows keyed by an nct_id column)"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(studies)").fetchall()]
+    return bool(columns) and "id" not in columns
+
+
+def get_last_update_date(study: Dict) -> str:
+    """Extract lastUpdatePostDate (YYYY-MM-DD) from a study"""
+    status_module = study.get("protocolSection", {}).get("statusModule", {})
+    return status_module.get("lastUpdatePostDateStruct", {}).get("date", "")
+
+
+def build_search_text(protocol_section: Dict) -> str:
+    """
+    Collect the text fields a query.term search would reasonably hit
+    """
+    identification = protocol_section.get("identificationModule", {})
+    conditions = protocol_section.get("conditionsModule", {})
+    eligibility = protocol_section.get("eligibilityModule", {})
+    description = protocol_section.get("descriptionModule", {})
+    interventions = protocol_section.get("armsInterventionsModule", {}).get("interventions", [])
+
+    parts = [
+        identification.get("nctId", ""),
+        identification.get("officialTitle", ""),
+        identification.get("briefTitle", ""),
+        " ".join(conditions.get("conditions", [])),
+        " ".join(conditions.get("keywords", [])),
+        " ".join(intervention.get("name", "") for intervention in interventions),
+        description.get("briefSummary", ""),
+        eligibility.get("eligibilityCriteria", ""),
+        eligibility.get("inclusionCriteria", ""),
+        eligibility.get("exclusionCriteria", ""),
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+def to_fts_query(condition: str) -> str:
+    """
+    Translate a query.term expression into an FTS5 MATCH expression
+
+    Plain words become quoted terms (implicitly ANDed), AND/OR/NOT and
+    parentheses are kept, and AREA[...] field filters are dropped since
+    the mirror only indexes free text.
+    """
+    condition = _AREA_RE.sub(" ", condition or "")
+
+    tokens = []
+    for token in _QUERY_TOKEN_RE.findall(condition):
+        if token in _FTS_OPERATORS or token in ("(", ")"):
+            tokens.append(token)
+        else:
+            word = token.strip('"').replace('"', "")
+            if word:
+                tokens.append(f'"{word}"')
+
+    # Drop operators left dangling after removing AREA[...] clauses
+    cleaned = []
+    for token in tokens:
+        if token in _FTS_OPERATORS and (not cleaned or cleaned[-1] in _FTS_OPERATORS or cleaned[-1] == "("):
+            continue
+        if token == ")" and cleaned and cleaned[-1] in _FTS_OPERATORS:
+            cleaned.pop()
+        cleaned.append(token)
+    while cleaned and cleaned[-1] in _FTS_OPERATORS:
+        cleaned.pop()
+
+    return " ".join(cleaned)
+
+
+_store: Optional[TrialStore] = None
+
+
+def get_trial_store() -> TrialStore:
+    """Shared store instance for the configured TRIAL_STORE_PATH"""
+    global _store
+    if _store is None:
+        _store = TrialStore(TRIAL_STORE_PATH)
+    return _store
+
+
+async def sync_trial_store(store: Optional[TrialStore] = None, full: bool = False,
+                           client: Optional[httpx.AsyncClient] = None) -> Dict[str, int]:
+    """
+    Pull studies changed since the previous sync into the mirror
+
+    The first run (or full=True) pulls every recruiting / not-yet-recruiting
+    study and then sweeps the mirror: stored studies the full pull did not
+    return (they stopped recruiting while no marker was kept) are deleted.
+    Later runs only request studies whose lastUpdatePostDate is on or after
+    the stored marker, without a status filter, so studies that stopped
+    recruiting are removed from the mirror.
+
+    Args:
+        store: Target store, defaults to the shared one
+        full: Ignore the sync marker and re-pull everything recruiting
+        client: HTTP client to use, defaults to the shared app-wide client
+
+    Returns:
+        Sync statistics
+    """
+    store = store or get_trial_store()
+    client = client or get_http_client()
+
+    marker = None if full else store.get_sync_marker()
+    # The mirror keeps whole protocol sections; results and derived sections are never read
+    params = {"pageSize": SYNC_PAGE_SIZE, "format": "json", "fields": "protocolSection"}
+    if marker:
+        params["filter.advanced"] = f"AREA[LastUpdatePostDate]RANGE[{marker},MAX]"
+        logger.info(f"Incremental sync of studies updated since {marker}")
+    else:
+        params["filter.overallStatus"] = ",".join(sorted(RELEVANT_STATUSES))
+        logger.info("Full sync of recruiting studies")
+
+    stats = {"pages": 0, "fetched": 0, "stored": 0, "removed": 0}
+    newest = marker or ""
+    # Mark phase of a full sync: every NCT ID the pull returned
+    seen_nct_ids: Optional[Set[str]] = None if marker else set()
+    page_token = None
+
+    while True:
+        if page_token:
+            params["pageToken"] = page_token
+
+        response = await get_with_retries(f"{CTGOV_API_BASE}/studies", params=params, client=client)
+        data = response.json()
+
+        studies = data.get("studies", [])
+        result = await asyncio.to_thread(store.upsert_studies, studies)
+
+        stats["pages"] += 1
+        stats["fetched"] += len(studies)
+        stats["stored"] += result["stored"]
+        stats["removed"] += result["removed"]
+        newest = max([newest] + [get_last_update_date(study) for study in studies])
+        if seen_nct_ids is not None:
+            seen_nct_ids.update(extract_nct_id(study) for study in studies)
+
+        logger.info(f"Sync page {stats['pages']}: {len(studies)} studies, "
+                    f"{result['stored']} stored, {result['removed']} removed")
+
+        page_token = data.get("nextPageToken")
+        if not page_token or not studies:
+            break
+
+    if seen_nct_ids is not None:
+        swept = await asyncio.to_thread(store.remove_except, seen_nct_ids)
+        stats["removed"] += swept
+        logger.info(f"Full sync sweep removed {swept} studies that are no longer recruiting")
+
+    if newest:
+        store.set_sync_marker(newest)
+
+    logger.info(f"Sync complete: {stats}, mirror now holds {store.count()} studies")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local ClinicalTrials.gov mirror")
+    parser.add_argument("--full", action="store_true", help="ignore the sync marker and re-pull everything")
+    parser.add_argument("--db", default=TRIAL_STORE_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    async def _run_sync():
+        try:
+            return await sync_trial_store(TrialStore(args.db), full=args.full)
+        finally:
+            await close_http_client()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(_run_sync()))
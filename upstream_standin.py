@@ -0,0 +1,335 @@
+"""
+Local stand-in for the ClinicalTrials.gov v2 API
+Serves the trial source fixtures (see trial_sources.RecordingSource) over
+HTTP, with configurable latency, throttling and error injection, so the real
+search / detail code path (pagination, rate limiting, retries) can be load
+tested on one machine. For offline runs that do not need the HTTP layer,
+TRIAL_DATA_SOURCE=fixture replays the same directory in-process.
+
+Record:  TRIAL_RECORD_DIR=fixtures uvicorn main:app
+Replay:  STANDIN_FIXTURE_DIR=fixtures uvicorn upstream_standin:create_standin_app --factory --port 8001
+         CTGOV_API_BASE=http://localhost:8001/api/v2 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from trial_index import merge_study
+from trial_sources import TRIAL_FIXTURE_DIR
+
+logger = logging.getLogger(__name__)
+
+STANDIN_FIXTURE_DIR = os.getenv("STANDIN_FIXTURE_DIR", TRIAL_FIXTURE_DIR)
+# none | fixed:SECONDS | uniform:MIN,MAX | lognormal:MEDIAN,SIGMA
+STANDIN_LATENCY = os.getenv("STANDIN_LATENCY", "none")
+STANDIN_429_RATE = float(os.getenv("STANDIN_429_RATE", "0"))      # fraction of requests throttled
+STANDIN_ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))  # fraction answered with a 5xx
+STANDIN_RETRY_AFTER = float(os.getenv("STANDIN_RETRY_AFTER", "1"))
+STANDIN_MAX_QPS = float(os.getenv("STANDIN_MAX_QPS", "0"))        # throttle above this rate (0 disables)
+STANDIN_SEED = os.getenv("STANDIN_SEED") or None
+
+API_PREFIX = "/api/v2"
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+ERROR_STATUSES = (500, 502, 503, 504)
+SYNTHETIC_TOKEN_PREFIX = "standin-"
+
+
+# Request parameters that shape the response rather than select studies
+PAGING_PARAMS = {"query.term", "pageSize", "pageToken", "format", "fields", "countTotal"}
+
+# A start-date slice from paginator.start_date_partitions, optionally AND-ed onto an existing filter
+_PARTITION_RE = re.compile(
+    r"^(?:\((?P<existing>.*)\) AND )?"
+    r"(?P<open>\()?AREA\[StartDate\]RANGE\[(?P<low>[^,\]]+), (?P<high>[^\]]+)\]"
+    r"(?(open) OR AREA\[StartDate\]MISSING\))$"
+)
+
+
+def search_key(condition: str, filters: Optional[Dict[str, str]]) -> str:
+    """Lookup key of a recorded search (the page size and max_results do not select studies)"""
+    return json.dumps([condition, sorted((filters or {}).items())], ensure_ascii=False)
+
+
+def _nct_id(study: Dict) -> Optional[str]:
+    return study.get("protocolSection", {}).get("identificationModule", {}).get("nctId")
+
+
+def _start_date(study: Dict) -> Optional[str]:
+    """Start date as YYYY-MM-DD (month-only dates count from the first of the month)"""
+    value = study.get("protocolSection", {}).get("statusModule", {}).get("startDateStruct", {}).get("date")
+    if not value:
+        return None
+    return value if len(value) > 7 else f"{value}-01"
+
+
+class UpstreamFixtures:
+    """
+    Trial source fixtures loaded for serving
+
+    Reads the directory written by trial_sources.RecordingSource:
+        searches/<sha1>.json  {"condition": ..., "max_results": ..., "filters": ..., "studies": [...]}
+        studies/<NCT ID>.json one study as returned by get_by_ids
+
+    Searches are indexed by condition and filters; every copy of a study
+    seen is merged into one record by NCT ID for bulk filter.ids requests
+    and study details.
+    """
+
+    def __init__(self, directory: str = STANDIN_FIXTURE_DIR):
+        self.directory = directory
+        self.searches: Dict[str, List[Dict]] = {}
+        self.studies: Dict[str, Dict] = {}
+
+    def _read_all(self, subdirectory: str) -> List[Dict]:
+        directory = os.path.join(self.directory, subdirectory)
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        recorded = []
+        for name in names:
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), encoding="utf-8") as fixture:
+                    recorded.append(json.load(fixture))
+        return recorded
+
+    def _index_study(self, study: Dict) -> None:
+        nct_id = _nct_id(study)
+        # Search results and details hold different projections of a study; combine them
+        if nct_id:
+            self.studies[nct_id] = merge_study(self.studies[nct_id], study) if nct_id in self.studies else study
+
+    def load(self) -> "UpstreamFixtures":
+        """Read every recorded search and study into memory"""
+        for recorded in self._read_all("searches"):
+            key = search_key(recorded["condition"], recorded.get("filters"))
+            studies = recorded["studies"]
+            # The same search recorded with different max_results: keep the fullest one
+            if len(studies) >= len(self.searches.get(key, [])):
+                self.searches[key] = studies
+            for study in studies:
+                self._index_study(study)
+        for study in self._read_all("studies"):
+            self._index_study(study)
+
+        logger.info(f"Stand-in loaded {len(self.searches)} searches, {len(self.studies)} studies "
+                    f"from {self.directory}")
+        return self
+
+    def lookup_search(self, params: Dict[str, str]) -> Optional[List[Dict]]:
+        """
+        Recorded studies answering a /studies search request, None when it was never recorded
+
+        A start-date slice of a recorded search (see paginator.partition_params)
+        resolves to the recording without the slice, narrowed to the studies
+        whose start date falls in it.
+        """
+        filters = {name: value for name, value in params.items() if name not in PAGING_PARAMS}
+        match = _PARTITION_RE.match(filters.get("filter.advanced", ""))
+        if match is None:
+            return self.searches.get(search_key(params.get("query.term", ""), filters))
+
+        if match.group("existing") is not None:
+            filters["filter.advanced"] = match.group("existing")
+        else:
+            del filters["filter.advanced"]
+        studies = self.searches.get(search_key(params.get("query.term", ""), filters))
+        if studies is None:
+            return None
+
+        low, high, missing = match.group("low"), match.group("high"), match.group("open") is not None
+        in_slice = []
+        for study in studies:
+            started = _start_date(study)
+            if started is None:
+                if missing:
+                    in_slice.append(study)
+            elif (low == "MIN" or started >= low) and (high == "MAX" or started <= high):
+                in_slice.append(study)
+        return in_slice
+
+
+def parse_latency(spec: str) -> Callable[[random.Random, float], float]:
+    """
+    Latency model from a spec string
+
+    Returns a function rng -> seconds to delay the response.
+    """
+    kind, _, args = spec.strip().lower().partition(":")
+    values = [float(value) for value in args.split(",") if value.strip()]
+
+    if kind in ("", "none"):
+        return lambda rng: 0.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown STANDIN_LATENCY '{spec}' "
+                     f"(expected none, fixed:S, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA)")
+
+
+class FaultInjector:
+    """Delays responses and replaces some of them with 429 / 5xx answers"""
+
+    def __init__(self, latency: str = STANDIN_LATENCY, throttle_rate: float = STANDIN_429_RATE,
+                 error_rate: float = STANDIN_ERROR_RATE, retry_after: float = STANDIN_RETRY_AFTER,
+                 max_qps: float = STANDIN_MAX_QPS, seed: Optional[str] = STANDIN_SEED):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_qps = max_qps
+        self.rng = random.Random(seed)
+
+        # Token bucket for max_qps, one second of burst
+        self._tokens = max_qps
+        self._refilled = time.monotonic()
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def _over_rate(self) -> bool:
+        if self.max_qps <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.max_qps, self._tokens + (now - self._refilled) * self.max_qps)
+        self._refilled = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def apply(self) -> Optional[Response]:
+        """Wait out the simulated latency; returns an injected failure or None to serve normally"""
+        self.requests += 1
+        if self._over_rate() or self.rng.random() < self.throttle_rate:
+            self.throttled += 1
+            return JSONResponse({"error": "Too Many Requests (stand-in)"}, status_code=429,
+                                headers={"Retry-After": f"{self.retry_after:g}"})
+
+        delay = self.latency(self.rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"error": "Injected upstream error (stand-in)"},
+                                status_code=self.rng.choice(ERROR_STATUSES))
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            "latency": self.latency_spec,
+            "throttle_rate": self.throttle_rate,
+            "error_rate": self.error_rate,
+            "max_qps": self.max_qps,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+        }
+
+
+def _page(studies: List[Dict], params: Dict[str, str]) -> Dict:
+    """One page of a result list, with a stand-in nextPageToken and totalCount when asked for"""
+    page_size = min(MAX_PAGE_SIZE, max(1, int(params.get("pageSize") or DEFAULT_PAGE_SIZE)))
+    token = params.get("pageToken", "")
+    offset = int(token[len(SYNTHETIC_TOKEN_PREFIX):]) if token.startswith(SYNTHETIC_TOKEN_PREFIX) else 0
+
+    page: Dict = {"studies": studies[offset:offset + page_size]}
+    if offset + page_size < len(studies):
+        page["nextPageToken"] = f"{SYNTHETIC_TOKEN_PREFIX}{offset + page_size}"
+    if params.get("countTotal") == "true" and not token:
+        page["totalCount"] = len(studies)
+    return page
+
+
+def create_standin_app(fixtures: Optional[UpstreamFixtures] = None,
+                       faults: Optional[FaultInjector] = None) -> FastAPI:
+    """
+    Stand-in app serving /api/v2/studies and /api/v2/studies/{nct_id}
+    (fixtures and faults default to the STANDIN_* environment settings)
+
+    Recorded searches (and start-date slices of them) are paged out of the
+    recording. A bulk filter.ids request or a study detail is answered from
+    the recorded studies by NCT ID; any other unrecorded search pages through
+    every recorded study, so arbitrary query mixes still produce realistic load.
+    """
+    fixtures = fixtures or UpstreamFixtures().load()
+    faults = faults or FaultInjector()
+    app = FastAPI(title="ClinicalTrials.gov stand-in")
+    corpus = list(fixtures.studies.values())
+    served = {"replayed": 0, "synthesized": 0, "not_found": 0}
+
+    @app.get(f"{API_PREFIX}/studies")
+    async def search_studies(request: Request):
+        failure = await faults.apply()
+        if failure is not None:
+            return failure
+
+        params = dict(request.query_params)
+        if params.get("filter.ids"):
+            served["replayed"] += 1
+            ids = [nct_id.strip() for nct_id in params["filter.ids"].split(",")]
+            return {"studies": [fixtures.studies[nct_id] for nct_id in ids if nct_id in fixtures.studies]}
+
+        studies = fixtures.lookup_search(params)
+        if studies is not None:
+            served["replayed"] += 1
+            return _page(studies, params)
+        served["synthesized"] += 1
+        return _page(corpus, params)
+
+    @app.get(f"{API_PREFIX}/studies/{{nct_id}}")
+    async def get_study(nct_id: str):
+        failure = await faults.apply()
+        if failure is not None:
+            return failure
+        if nct_id in fixtures.studies:
+            served["replayed"] += 1
+            return fixtures.studies[nct_id]
+        served["not_found"] += 1
+        return JSONResponse({"error": f"{nct_id} not recorded"}, status_code=404)
+
+    @app.get("/standin/stats")
+    async def stats():
+        return {"fixtures": {"searches": len(fixtures.searches), "studies": len(fixtures.studies)},
+                "served": served, "faults": faults.stats()}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded trial source fixtures as the ClinicalTrials.gov API")
+    parser.add_argument("--fixtures", default=STANDIN_FIXTURE_DIR, help="directory written by TRIAL_RECORD_DIR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default=STANDIN_LATENCY, help="none, fixed:S, uniform:MIN,MAX "
+                                                                   "or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--throttle-rate", type=float, default=STANDIN_429_RATE, help="fraction answered 429")
+    parser.add_argument("--error-rate", type=float, default=STANDIN_ERROR_RATE, help="fraction answered 5xx")
+    parser.add_argument("--max-qps", type=float, default=STANDIN_MAX_QPS, help="answer 429 above this rate")
+    parser.add_argument("--seed", default=STANDIN_SEED)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    standin = create_standin_app(
+        UpstreamFixtures(args.fixtures).load(),
+        FaultInjector(args.latency, args.throttle_rate, args.error_rate, STANDIN_RETRY_AFTER, args.max_qps, args.seed),
+    )
+    uvicorn.run(standin, host=args.host, port=args.port, log_level="warning")
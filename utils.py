@@ -37,6 +37,35 @@ def parse_age(age_str: str) -> int:
     return int(numbers[0]) if numbers else 0
 
 
+# Length of each ClinicalTrials.gov age unit in years
+AGE_UNIT_YEARS = {
+    "year": 1.0,
+    "month": 1 / 12,
+    "week": 7 / 365.25,
+    "day": 1 / 365.25,
+    "hour": 1 / (365.25 * 24),
+    "minute": 1 / (365.25 * 24 * 60),
+}
+AGE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(year|month|week|day|hour|minute)?", re.IGNORECASE)
+
+
+def parse_age_years(age_str: str) -> Optional[float]:
+    """
+    Parse an age limit into years, honoring its unit
+
+    Args:
+        age_str: Age string like "18 Years", "6 Months", "28 Days"
+
+    Returns:
+        Age in years (a bare number counts as years), None if there is no number
+    """
+    match = AGE_PATTERN.search(age_str or "")
+    if not match:
+        return None
+    unit = (match.group(2) or "year").lower()
+    return float(match.group(1)) * AGE_UNIT_YEARS[unit]
+
+
 def normalize_gender(gender: str) -> str:
     """
     Normalize gender input to standard values
@@ -98,6 +127,24 @@ def extract_nct_id(trial_data: dict) -> str:
         return ""
 
 
+def study_version_key(trial_data: dict) -> Optional[str]:
+    """
+    Identify one published version of a study
+
+    Args:
+        trial_data: Trial data dictionary
+
+    Returns:
+        "<NCT ID>@<lastUpdatePostDate>", or None when either is missing
+    """
+    protocol_section = trial_data.get("protocolSection", {})
+    nct_id = protocol_section.get("identificationModule", {}).get("nctId", "")
+    last_update = protocol_section.get("statusModule", {}).get("lastUpdatePostDateStruct", {}).get("date", "")
+    if not nct_id or not last_update:
+        return None
+    return f"{nct_id}@{last_update}"
+
+
 def safe_get_nested(data: dict, keys: list, default=None):
     """
     Safely get nested dictionary values